@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+
+#this script finds the traces and mark areas between neighbouring layers
+#a trace is the part of a polygon that is covered by a polygon on the layer above
+#a mark area is the part of a trace that is covered by a trace on the layer above
+#each pair of layers only needs the shapes of those two layers
+#so the pairs can be spread over several worker processes
+#the workers hand their results back as WKB, which pickles cheaply
+
+from shapely import wkb
+from shapely.strtree import STRtree
+from worker_pool import forked_pool, worker_state, chunk_size
+
+
+class shape_index:
+	#this class is a spatial index over a list of objects
+	#each object is paired with a shapely geometry
+	#a query returns the objects whose geometry has a bounding box
+	#that overlaps the bounding box of the query geometry
+	#so only those need the full shapely test
+	def __init__(self,items,geoms):
+		self.items = list(items)
+		self.geoms = list(geoms)
+		#the tree hands back the geometries themselves
+		#so keep track of where each one came from
+		self.position = dict()
+		for i,geom in enumerate(self.geoms):
+			self.position[id(geom)] = i
+		self.tree = STRtree(self.geoms)
+
+	def query(self,geom):
+		#return the candidate objects in their original order
+		found = [self.position[id(hit)] for hit in self.tree.query(geom)]
+		found.sort()
+		return [self.items[i] for i in found]
+
+def pair_traces(lower_shapes,upper_shapes):
+	#this function traces the shapes of the layer above onto the layer below
+	#it returns a list with the trace polygons of each lower shape
+	#index the upper layer so each lower shape is only tested
+	#against the upper shapes whose bounding boxes overlap it
+	upper_index = shape_index(upper_shapes,upper_shapes)
+	traces = list()
+	for curr_shape in lower_shapes:
+		shape_traces = list()
+		#check each nearby shape in the upper layer
+		for check_shape in upper_index.query(curr_shape):
+			if curr_shape.intersects(check_shape):
+				#in this case, the two interact
+				#the intersection is the trace
+				trace_poly = curr_shape.intersection(check_shape)
+				if trace_poly.type == 'Polygon':
+					shape_traces.append(trace_poly)
+				elif trace_poly.type == 'MultiPolygon':
+					#in this case, we have a multipolygon
+					#we need to extract each polygon
+					for part in trace_poly:
+						shape_traces.append(part)
+				else:
+					print "Crazy intersection: " + trace_poly.type
+		traces.append(shape_traces)
+	return traces
+
+def pair_mark_areas(lower_traces,upper_traces):
+	#this function finds the mark areas of one layer
+	#lower_traces holds a list of traces for each polygon of the layer
+	#upper_traces is every trace on the layer above
+	#it returns a list with the mark area polygons of each polygon
+	#index the traces above so each trace is only intersected
+	#with the traces above whose bounding boxes overlap it
+	trace_index = shape_index(upper_traces,upper_traces)
+	mark_areas = list()
+	for shape_traces in lower_traces:
+		shape_mark_areas = list()
+		for curr_trace in shape_traces:
+			for check_trace in trace_index.query(curr_trace):
+				mark_area = curr_trace.intersection(check_trace)
+				if mark_area.is_empty:
+					#the bounding boxes overlap, but the traces don't
+					continue
+				if mark_area.type == 'Polygon':
+					#only one overlapping area
+					shape_mark_areas.append(mark_area)
+				elif mark_area.type == 'MultiPolygon':
+					#in this case, extract each poly separately
+					for part in mark_area:
+						shape_mark_areas.append(part)
+				elif mark_area.type == "GeometryCollection":
+					#empty collections were skipped above
+					#so this one mixes areas with lines or points
+					print "Error with mark areas.  Geometry Collection Length non-zero"
+				else:
+					print "Trouble with mark area " + mark_area.type
+		mark_areas.append(shape_mark_areas)
+	return mark_areas
+
+def parallel_layer_geometry(layer_shapes,jobs):
+	#this function finds the traces and mark areas of every layer
+	#spread over jobs worker processes
+	#layer_shapes holds a list of polygon shapes for each layer
+	#it returns the traces and the mark areas, each as a list
+	#for every layer, holding a list for every shape
+	#the top layer has nothing above it, so it has none of either
+	traces = [[list() for shape in shapes] for shapes in layer_shapes]
+	mark_areas = [[list() for shape in shapes] for shapes in layer_shapes]
+	pair_count = len(layer_shapes)-1
+	if pair_count < 1:
+		return traces, mark_areas
+	chunk = chunk_size(pair_count,jobs)
+	pool = forked_pool(jobs,layers=layer_shapes)
+	try:
+		#the traces of every pair first
+		for i,pair_wkb in enumerate(pool.imap(trace_run,range(pair_count),chunk)):
+			traces[i] = load_lists(pair_wkb)
+		#the mark areas need the traces of the layer above as well
+		#so they are sent to the workers along with the traces of the layer
+		tasks = [(dump_lists(traces[i]),[wkb.dumps(trace) for shape_traces in traces[i+1] for trace in shape_traces])
+				 for i in range(pair_count)]
+		for i,pair_wkb in enumerate(pool.imap(mark_area_run,tasks,chunk)):
+			mark_areas[i] = load_lists(pair_wkb)
+	finally:
+		pool.close()
+	return traces, mark_areas
+
+def trace_run(i):
+	#this function runs in a worker process
+	#it traces layer i+1 onto layer i
+	layer_shapes = worker_state['layers']
+	return dump_lists(pair_traces(layer_shapes[i],layer_shapes[i+1]))
+
+def mark_area_run(task):
+	#this function runs in a worker process
+	#it finds the mark areas of one layer from its traces
+	#and the traces on the layer above
+	lower_wkb, upper_wkb = task
+	upper_traces = [wkb.loads(trace) for trace in upper_wkb]
+	return dump_lists(pair_mark_areas(load_lists(lower_wkb),upper_traces))
+
+def dump_lists(geom_lists):
+	return [[wkb.dumps(geom) for geom in geoms] for geoms in geom_lists]
+
+def load_lists(wkb_lists):
+	return [[wkb.loads(data) for data in geoms] for geoms in wkb_lists]
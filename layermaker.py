@@ -2,302 +2,295 @@
 
 #this function will take an STL file, and return paths representing slices
 
+from multiprocessing import sharedctypes
 import numpy as np
 from stl import mesh
+from worker_pool import forked_pool, worker_state
 
 
-def process_triangle(tri_arr, cut_z):
-	#this function gets passed a triangle 
-	#it will process the triangle to determine if it is used in the cut
-	#if it is, it will process the triangle and return a type number
-	#default type is zero, which means triangle not used
-	t_type = 0
-	#counter for the number of zeros
-	zero_count = 0
-	#get the z coords
-	z1 = tri_arr[0][2]-cut_z
-	if z1 == 0:
-		zero_count= zero_count +1
-	z2 = tri_arr[1][2]-cut_z
-	if z2 == 0:
-		zero_count=zero_count + 1
-	z3 = tri_arr[2][2]-cut_z
-	if z3 == 0:
-		zero_count = zero_count + 1
-	#check conditions for triangle
-	if z1>0 and z2 > 0 and z3> 0 :
-		#triangle not needed
-		#all verticies above the cutline
-		pass
-	elif z1<0 and z2<0 and z3<0:
-		#triangle not needed
-		#all verticies below the cutline
-		pass
-	elif zero_count == 3:
-		#triangle not needed
-		#flat surface will be picked up elsewhere
-		pass
-	elif zero_count ==2:
-		#this type of triangle has two points on the cutline
-		#we can take the segment from this triangle as is
-		#it will be processed in one fashion
-		t_type = 1
-	elif zero_count == 1:
-		#this case we need to test
-		#if there is one point on the cut line
-		#then the other two points are either across the cutline
-		#or both on the same side
-		#if they cross, then we want the triangle
-		#if they are both on the same side, then we don't
-		if z1==0:
-			if z2*z3>0:
-				#in this case, same side
-				#do nothing
-				pass
-			else:
-				t_type = 2
-		elif z2==0:
-			if z1*z3>0:
-				pass
-			else:
-				t_type = 2
-		else:
-			if z1*z2>0:
-				pass
-			else:
-				t_type = 2
-	else:
-		#in this case, one vertex is on opposite sides of the other two
-		t_type = 3
+def classify_triangles(vectors, cut_z):
+	#this function gets passed the whole (n,3,3) array of triangles
+	#it will classify every triangle against the cut plane at once
+	#and return the type of each triangle plus the segments
+	#that the used triangles leave on the cut plane
+	#types are:
+	#0 - triangle not used (all on one side, flat on the plane,
+	#    or touching the plane at a single vertex)
+	#1 - two verticies on the cut plane, the segment is taken as is
+	#2 - one vertex on the cut plane, the other two across it
+	#3 - one vertex on the opposite side of the other two
+	#segments are returned in triangle order as an (m,2,2) array
+	#[[x1,y1]
+	# [x2,y2]]
+	#z coordinate will be cut_z for every point
+	#stl files store single precision, do the math in double
+	#so the segment endpoints still match within max_error
+	vectors = np.asarray(vectors,dtype=np.float64)
+	z = vectors[:,:,2]-cut_z
+	above = z>0
+	below = z<0
+	on_plane = z==0
+	zero_count = on_plane.sum(axis=1)
+	above_count = above.sum(axis=1)
+	below_count = below.sum(axis=1)
 	
-	return t_type
+	t_type = np.zeros(len(vectors),dtype=np.int8)
+	t_type[zero_count==2] = 1
+	t_type[(zero_count==1) & (above_count==1) & (below_count==1)] = 2
+	t_type[(zero_count==0) & (above_count>0) & (below_count>0)] = 3
 	
-def get_segment(tri_arr,t_type,cut_z):
-	#this function will take a triangle and type 
-	#and process the triangle to return a segment
-	#the segement represents the boundry on the cut plane
-	#format is a 2x2 array
-	#z coordinate will be cut_z for every point
-	#[[x1,y1]
-	# [x2,y2]]	
-	segment = np.zeros((2,2))
-	if t_type == 1:
-		#in this case two of the vertices are on the cut plane
-		#those two verticies define the segment
-		curr_vert = 0
-		for vertex in tri_arr:
-			if vertex[2] == cut_z:
-				segment[curr_vert] = vertex[:2]
-				curr_vert = curr_vert + 1
-				
-	elif t_type == 2:
-		#in this case, one of the verticies is on the cut plane
-		#the other two verticies will be needed to get the other point
-		#i can't figure out how to do this more clever
-		vorder = range(3)
-		while tri_arr[vorder[0]] != cut_z:
-				vorder.insert(0,vorder.pop())
-			
-		#at this point, the vertex on the cut plane is located at vorder[0]
-		segment[0] = tri_arr[vorder[0][:2]]
-		segment[1] = get_intersect(tri_arr[vorder[1]],tri_arr[vorder[2]],cut_z)
-		
-		
-	elif t_type ==3:
-		#in this case, one point is on one side of the cut plane
-		#the other two are on the opposite side
-		#we need to use the two segments to calculate intersection with
-		#the cut plane, and those two intersections will define the segment
-		
-		#this is also the opposite of clever
-		signs = list()
-		for i in range(3):
-			if tri_arr[i][2]-cut_z > 0:
-				signs.append(1)
-			else:
-				signs.append(-1)
-			
-		product = signs[0]*signs[1]*signs[2]
-		vorder = range(3)
-		while signs[vorder[0]] != product:
-			vorder.insert(0,vorder.pop())
-			
-		#at this point, vorder[0] gives the position of the one vertex
-		#on opposite side of the cut plane from the other two
-		
-		segment[0] = get_intersect(tri_arr[vorder[0]],tri_arr[vorder[1]],cut_z)
-		segment[1] = get_intersect(tri_arr[vorder[0]],tri_arr[vorder[2]],cut_z)
-		
-				
-	else:
-		#this is an error
-		print("Something has gone wrong with Triangle Type")
-		
-	return segment
+	used = t_type>0
+	tris = vectors[used]
+	types = t_type[used]
+	on_plane = on_plane[used]
+	#the sign of each vertex, points on the plane count as below
+	signs = np.where(z[used]>0,1,-1)
 	
-def get_intersect(v1,v2,cut_z):
-	#this function takes two verticies of a triangle
-	#and returns the the one point where the line segment
-	#intersects the z-plane at the given cut_z
-	z_const = (cut_z-v1[2])/(v2[2]-v1[2])
-	x_coord = z_const*(v2[0]-v1[0]) + v1[0]
-	y_coord = z_const * (v2[1]-v1[1]) + v1[1]
-	return [x_coord,y_coord]
-		
-def segments_test(seg_status):
-	#this function will test every element in the seg status array
-	#if any segment is unused (ie value of seg_status is 0)
-	#it will return true
-	#else it will return false
+	#for each used triangle pick three vertex indices (a,b,c)
+	#type 1: a and b are the two verticies on the plane
+	#type 2: a is the vertex on the plane, b and c are across it
+	#type 3: a is the vertex alone on its side of the plane
+	first = np.argmax(on_plane,axis=1)
+	last = 2-np.argmax(on_plane[:,::-1],axis=1)
+	lone = np.argmax(signs==np.prod(signs,axis=1)[:,None],axis=1)
+	a = np.where(types==3,lone,first)
+	b = np.where(types==1,last,(a+1)%3)
+	c = (a+2)%3
 	
-	for status in seg_status:
-		if status ==0:
-			return True
-		
-	#if no zeros found, return false
-	return False
-
+	rows = np.arange(len(tris))
+	va = tris[rows,a]
+	vb = tris[rows,b]
+	vc = tris[rows,c]
+	
+	segments = np.zeros((len(tris),2,2))
+	#type 1 and 2 start at vertex a, which is on the plane
+	#type 3 starts where edge a-b crosses the plane
+	segments[:,0] = np.where((types==3)[:,None],get_intersects(va,vb,cut_z),va[:,:2])
+	#type 1 ends at vertex b, which is on the plane
+	#type 2 ends where edge b-c crosses the plane
+	#type 3 ends where edge a-c crosses the plane
+	segments[:,1] = np.where((types==1)[:,None],vb[:,:2],
+		np.where((types==2)[:,None],get_intersects(vb,vc,cut_z),get_intersects(va,vc,cut_z)))
+	
+	return t_type, segments
 	
+def get_intersects(v1,v2,cut_z):
+	#this function takes two (m,3) arrays of verticies
+	#and returns the (m,2) points where each line segment
+	#intersects the z-plane at the given cut_z
+	dz = v2[:,2]-v1[:,2]
+	#rows that don't cross the plane are thrown away by the caller
+	#keep them from dividing by zero
+	dz = np.where(dz==0,1.0,dz)
+	z_const = (cut_z-v1[:,2])/dz
+	return v1[:,:2] + z_const[:,None]*(v2[:,:2]-v1[:,:2])
+		
 class new_loop:
 	def __init__(self,first_segment):
 		self.start_x = first_segment[0][0]
 		self.start_y = first_segment[0][1]
 		self.search_x = first_segment[1][0]
 		self.search_y = first_segment[1][1]
-		self.points_string = str(self.start_x)+ ',' + str(self.start_y) + ' '
-		self.points_string += str(self.search_x)+ ',' + str(self.search_y) + ' '
+		self.point_list = [(self.start_x,self.start_y),(self.search_x,self.search_y)]
 		self.closed = False
 		
 	def add_point(self,segment,max_err):
 		if not self.closed:
-			self.points_string+=str(segment[1][0]) + ',' + str(segment[1][1]) + ' '
+			self.point_list.append((segment[1][0],segment[1][1]))
 			self.search_x=segment[1][0]
 			self.search_y=segment[1][1]
 			
 			if abs(self.search_x - self.start_x)<max_err and abs(self.search_y - self.start_y)<max_err:
 				self.closed=True
+				#the last point is only within max_err of the start
+				#close the loop on the start itself
+				#so it doesn't end with a tiny step back across itself
+				self.point_list[-1] = (self.start_x,self.start_y)
 		else:
 			print "Error! Trying to add point to closed loop"
+			
+	def points(self):
+		#return the loop as an (n,2) array of x,y points
+		return np.array(self.point_list,dtype=np.float64)
 		
 		
-def call_layermaker(inputs,cut_z):		
-	#load values from inputs
-	newmesh = inputs.current_mesh
-	max_err = inputs.max_error
+def sweep_layermaker(inputs,cut_heights):
+	#this function slices the mesh at every height in cut_heights
+	#and yields the loops for each layer in turn
+	#the heights must be in increasing order
+	return facet_sweep(inputs.current_mesh.vectors,inputs.mesh_index).layers(inputs,cut_heights)
 	
-	print "Testing Cutting Plane: ", cut_z
+def parallel_layermaker(inputs,cut_heights):
+	#this function slices the mesh at every height in cut_heights
+	#spread over inputs.jobs worker processes
+	#and yields the loops for each layer in layer order
+	#the heights are split into runs of neighbouring layers
+	#so each worker can still sweep up through its own run
+	#the mesh arrays are moved into shared memory before the workers start
+	#so every worker reads the same copy instead of getting its own
+	sweep = facet_sweep(inputs.current_mesh.vectors,inputs.mesh_index)
+	share_arrays(sweep)
+	if sweep.index <> '':
+		share_arrays(sweep.index)
+	#use a few runs per worker so a worker that gets a
+	#thin part of the model doesn't sit idle
+	run_count = min(len(cut_heights),4*inputs.jobs)
+	runs = [list(run) for run in np.array_split(np.asarray(cut_heights),max(run_count,1))]
+	pool = forked_pool(inputs.jobs,sweep=sweep,inputs=inputs)
+	try:
+		for run_loops in pool.imap(slice_run,runs):
+			for layer_loops in run_loops:
+				yield layer_loops
+	finally:
+		pool.close()
+		
+def slice_run(cut_heights):
+	#this function runs in a worker process
+	#it slices one run of neighbouring layers
+	return list(worker_state['sweep'].layers(worker_state['inputs'],cut_heights))
 	
-	#count triangles to size arrays
-	tri_count = len(newmesh.vectors)
-	tri_status = np.zeros(tri_count)
+def share_arrays(ob):
+	#this function moves every numpy array attribute of an object
+	#into shared memory, so forked worker processes all read the same pages
+	for name, value in vars(ob).items():
+		if isinstance(value,np.ndarray):
+			raw = sharedctypes.RawArray('b',max(value.nbytes,1))
+			shared = np.frombuffer(raw,dtype=value.dtype,count=value.size).reshape(value.shape)
+			shared[...] = value
+			setattr(ob,name,shared)
 	
-	if inputs.verbose:
-		print "Evaluating triangles in mesh"
-	#iterate through every triangle
-	for i,tri_arr in enumerate(newmesh.vectors):
-		tri_status[i]=process_triangle(tri_arr,cut_z)
+class facet_sweep:
+	#this class holds the facets of a mesh sorted by their lowest z
+	#instead of rescanning the whole mesh for every layer
+	#an active set of facets that can touch the plane is kept
+	#as the plane moves up through the mesh
+	#facets join the active set when the plane reaches their bottom
+	#and leave it once the plane has passed their top
+	#index is the mesh_index of the same facets, to walk the loops from face to face
+	#or '' to match the segments of each layer by their coordinates
+	def __init__(self,vectors,index=''):
+		self.vectors = np.asarray(vectors,dtype=np.float64)
+		self.index = index
+		self.z_min = self.vectors[:,:,2].min(axis=1)
+		self.z_max = self.vectors[:,:,2].max(axis=1)
+		self.order = np.argsort(self.z_min,kind='mergesort')
+		self.sorted_min = self.z_min[self.order]
 		
-	#now we have an array that tells us the status of every triangle
-	#count the number of nonzeros
-	tri_useful = 0
-	for tri_stat in tri_status:
-		if tri_stat >0:
-			tri_useful= tri_useful+ 1
-	
-	if inputs.verbose:
-		print "Creating Segment List"
-	#tri_useful is the count of needed triangles
-	#each triangle will yield one segment
-	#create an array to hold the segments
-	seg_arr = np.zeros((tri_useful,2,2))
-	#create an index for the current segment
-	#initialize to -1
-	curr_seg = -1
-	for i, tri_stat in enumerate(tri_status):
-		if tri_stat>0:
-			#in this case, the triangle is needed
-			#index segment number
-			curr_seg = curr_seg + 1
-			seg_arr[curr_seg] = get_segment(newmesh.vectors[i],tri_stat,cut_z)
+	def layers(self,inputs,cut_heights):
+		#yield the loops for each height in cut_heights
+		#the heights must be in increasing order
+		active = np.zeros(0,dtype=np.intp)
+		next_facet = 0
+		for cut_z in cut_heights:
+			print "Testing Cutting Plane: ", cut_z
+			#add every facet whose bottom is at or below the plane
+			stop = np.searchsorted(self.sorted_min,cut_z,side='right')
+			active = np.concatenate((active,self.order[next_facet:stop]))
+			next_facet = stop
+			#drop every facet whose top is below the plane
+			active = active[self.z_max[active]>=cut_z]
+			#keep the facets in mesh order so the loops come out
+			#the same as slicing the whole mesh
+			active.sort()
 			
+			if inputs.verbose:
+				print "Evaluating " + str(len(active)) + " active triangles"
+			if self.index <> '':
+				#the mesh connectivity is known
+				#walk the loops from face to face
+				yield self.index.trace_loops(cut_z,active)
+			else:
+				tri_status, seg_arr = classify_triangles(self.vectors[active],cut_z)
+				yield stitch_segments(seg_arr,inputs)
+	
+def stitch_segments(seg_arr,inputs):
+	#this function takes the segments from one cut plane
+	#and joins them end to end into closed loops
+	#it returns a list of (n,2) point arrays, one per loop
+	max_err = inputs.max_error
+	
 	#seg_arr now contains an unsorted list of all segments required to build
 	#all the loops for this slice
 	#create an array that tracks segment status
+	#segment status will be 0 if the segment is unused
+	#change to 1 when the segment is included in an existing loop
 	seg_status = np.zeros(len(seg_arr))
 	
 	if inputs.verbose:
 		print "Matching segments"
-	#segment status will be 0 if the segment is unused
-	#change to 1 when the segment is included in an existing loop
-	pointstr_list = list()
-	while segments_test(seg_status):
-		#find the first unused segment
-		for i,status in enumerate(seg_status):
-			if status == 0:
-				#found an unused segment
-				#set status to used
-				seg_status[i]=1
-				print "\nCreating New Loop\n"
-				current_loop = new_loop(seg_arr[i])
-				#if inputs.verbose:
-				#	print "Creating new loop using segment: ", i
-				while not current_loop.closed:
-					found_segment = False
-					for j,curr_status in enumerate(seg_status):
-						if seg_status[j]==0:
-							#check to see if this unused status matches
-							#if inputs.verbose:
-							#	print "Checking segment: ", j ," of ", len(seg_status)
-							
-							if abs(seg_arr[j][0][0] - current_loop.search_x)<max_err:
-								#x coordinates match
-								if abs(seg_arr[j][0][1] - current_loop.search_y)<max_err:
-									#and y coordinates match
-									#this is the next segment in the loop
-									#no need to modify order
-									#if inputs.verbose:
-									#	print "Matched Segment ", j
-									seg_status[j]=1
-									current_loop.add_point(seg_arr[j],max_err)
-									found_segment = True
-									break
-									
-							
-							if abs(seg_arr[j][1][0] - current_loop.search_x)<max_err:
-								#x coordinates match
-								if abs(seg_arr[j][1][1] - current_loop.search_y)<max_err:
-									#and y coordinates match
-									#this is the next segment in the loop
-									#need to modify to put in correct order
-									#if inputs.verbose:
-									#	print "Matched Segment ", j
-									seg_status[j]=1
-									temp_array = np.zeros((2,2))
-									temp_array[0] = seg_arr[j][1]
-									temp_array[1] = seg_arr[j][0]
-									current_loop.add_point(temp_array,max_err)
-									found_segment = True
-									break
-									
-									
-					if not found_segment:
-						#first check if there if all the segments have been used
-						#if so, close the loop
-						all_used = True
-						for i in seg_status:
-							if i==0:
-								all_used = False
-								break
-						#if possible close loop
-						if all_used:
-							current_loop.closed= True
-						#if the loop isn't closed, then throw error
-						if not current_loop.closed:	
-							print "Error! No segment found on search."
-							
-							
-						
-				pointstr_list.append(current_loop.points_string)
-				#print current_loop.points_string
-	return pointstr_list
+	#index every segment end by the grid cell it falls in
+	#so the next segment of a loop is found by looking in
+	#the cells around the search point instead of scanning every segment
+	endpoint_index = index_endpoints(seg_arr,max_err)
+	loop_list = list()
+	#segments are used in order, so the first unused one
+	#is never behind this position
+	first_unused = 0
+	while first_unused < len(seg_arr):
+		if seg_status[first_unused] != 0:
+			first_unused += 1
+			continue
+		#found an unused segment
+		#set status to used
+		seg_status[first_unused]=1
+		print "\nCreating New Loop\n"
+		current_loop = new_loop(seg_arr[first_unused])
+		while not current_loop.closed:
+			match = find_next_segment(endpoint_index,seg_arr,seg_status,
+				current_loop.search_x,current_loop.search_y,max_err)
+			if match is not None:
+				j, end = match
+				seg_status[j]=1
+				if end == 0:
+					#the segment starts at the search point
+					#no need to modify order
+					current_loop.add_point(seg_arr[j],max_err)
+				else:
+					#the segment ends at the search point
+					#need to flip it to put it in the correct order
+					current_loop.add_point(seg_arr[j][::-1],max_err)
+			else:
+				#first check if there if all the segments have been used
+				#if so, close the loop
+				if not (seg_status==0).any():
+					current_loop.closed= True
+				#if the loop isn't closed, then throw error
+				#and give up on this loop instead of searching forever
+				if not current_loop.closed:	
+					print "Error! No segment found on search."
+					current_loop.closed = True
+				
+		loop_list.append(current_loop.points())
+	return loop_list
+	
+def index_endpoints(seg_arr,max_err):
+	#build a dictionary that maps a grid cell to the segment ends inside it
+	#the grid cells are max_err wide, so any end within max_err
+	#of a point is in the cell of that point or one of its neighbours
+	#each entry is a (segment number, end number) pair
+	cells = np.floor(seg_arr/max_err).astype(np.int64).tolist()
+	endpoint_index = dict()
+	for i,seg_cells in enumerate(cells):
+		for end,cell in enumerate(seg_cells):
+			endpoint_index.setdefault(tuple(cell),list()).append((i,end))
+	return endpoint_index
 	
+def find_next_segment(endpoint_index,seg_arr,seg_status,search_x,search_y,max_err):
+	#look through the cells around the search point for an unused segment
+	#with an end that matches the search point within max_err
+	#if more than one matches, take the lowest segment number
+	#and prefer its start to its end
+	#returns (segment number, end number) or None if nothing matches
+	cell_x = int(np.floor(search_x/max_err))
+	cell_y = int(np.floor(search_y/max_err))
+	best = None
+	for dx in (-1,0,1):
+		for dy in (-1,0,1):
+			for j,end in endpoint_index.get((cell_x+dx,cell_y+dy),()):
+				if seg_status[j] != 0:
+					continue
+				if abs(seg_arr[j][end][0] - search_x)<max_err and \
+				   abs(seg_arr[j][end][1] - search_y)<max_err:
+					if best is None or (j,end) < best:
+						best = (j,end)
+	return best
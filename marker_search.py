@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+
+#this script searches the mark areas of a polygon for places a mark could fit
+#where a mark can go depends on the mark already placed on the layer below,
+#which is only known once the layers below have been marked
+#but whether the mark fits inside a mark area does not
+#so the search for points where a mark fits can be done for every polygon
+#at once, spread over worker processes
+#and only the check against the mark below is left to do in layer order
+
+import numpy as np
+from shapely import vectorized
+from polylabel import pole_of_inaccessibility, area_distance
+from worker_pool import forked_pool, worker_state, chunk_size
+
+#the size of the pentagonal layer marks
+mark_radius = 2
+#the number of search points measured against the edges of an area at once
+#the distance to every edge is held for each point in the chunk
+search_chunk = 1024
+
+
+def spiral_points(cen_x,cen_y,radius,max_bound):
+	#this function builds the test points for the mark search as an (n,2) array
+	#the first point is the center
+	#then the points on circles around the center, one radius apart
+	#stepping one radius along each circle
+	#until the circle radius reaches max_bound
+	point_list = [np.array([[cen_x,cen_y]],dtype=np.float64)]
+	dist = radius
+	while dist < max_bound:
+		del_theta = float(radius)/float(dist)
+		#add up the steps one at a time so the angles are the same
+		#as stepping theta along the circle
+		steps = int(2*3.1415/del_theta)+2
+		theta = np.concatenate(([0.0],np.cumsum(np.full(steps,del_theta))))
+		theta = theta[theta < 2*3.1415]
+		point_list.append(np.column_stack((cen_x + dist*np.cos(theta), cen_y + dist*np.sin(theta))))
+		#increment distance by radius and repeat
+		dist += radius
+	return np.concatenate(point_list)
+
+def area_search_points(curr_area,test_area,radius):
+	#this function returns the search points for a mark area in search order
+	#the search starts at the centroid of the area
+	#and circles out until the circle radius exceeds
+	#the maximum bounds of test_area minus two radii
+	#points outside the mark area can't have the mark around them
+	#so they are thrown out all at once
+	centroid = curr_area.centroid
+	max_bound = 0
+	for bound in test_area.bounds:
+		if abs(bound) > max_bound:
+			max_bound = abs(bound)
+	max_bound = max_bound - 2*radius
+	search_points = spiral_points(centroid.x,centroid.y,radius,max_bound)
+	keep = vectorized.contains(curr_area,search_points[:,0],search_points[:,1])
+	return search_points[keep]
+
+def fitting_points(curr_area,search_points,radius,mark_point='dummy'):
+	#this function yields the search points where a mark fits, in search order
+	#the mark fits at a point one radius or more from every edge of curr_area
+	#if mark_point is a Point, the mark on the layer below,
+	#the mark also has to be two radii or more from it
+	#the points are measured a chunk at a time
+	#so a search that stops at the first point found doesn't measure the rest
+	#each chunk that has points where the mark fits is yielded as an (n,2) array
+	if mark_point == 'dummy':
+		distance = area_distance(curr_area)
+	else:
+		#the mark below counts as an edge one radius out from it
+		distance = area_distance(curr_area,mark_point,radius)
+	for start in range(0,len(search_points),search_chunk):
+		chunk = search_points[start:start+search_chunk]
+		fits = chunk[distance(chunk[:,0],chunk[:,1]) >= radius]
+		if len(fits) > 0:
+			yield fits
+
+def mark_candidates(mark_areas,upper_shape,radius):
+	#this function finds the points where a mark fits in each mark area
+	#leaving out the check against the mark below
+	#it returns one entry for each mark area
+	#'' if the area covered by upper_shape is too small for a mark
+	#otherwise a (points, pole) pair
+	#points is an (n,2) array of the search points where the mark fits
+	#pole is the point furthest from the edges of the area,
+	#or '' if the mark doesn't fit anywhere in the area
+	#the mark below rules out the points within two radii of it
+	#so two points four radii apart can't both be ruled out
+	#the search stops at the first point four radii from the first point found,
+	#as the point the mark goes at is always one of the points before it
+	check_area = radius*radius*3.1415
+	candidates = list()
+	for curr_area in mark_areas:
+		test_area = curr_area.intersection(upper_shape)
+		if not test_area.area > check_area:
+			candidates.append('')
+			continue
+		pole = pole_of_inaccessibility(curr_area,radius/20.0,min_dist=radius)
+		found = list()
+		if pole <> '':
+			search_points = area_search_points(curr_area,test_area,radius)
+			for fits in fitting_points(curr_area,search_points,radius):
+				if len(found) == 0:
+					first_x, first_y = fits[0]
+				far = np.hypot(fits[:,0]-first_x,fits[:,1]-first_y) >= 4*radius
+				if far.any():
+					found.append(fits[:np.argmax(far)+1])
+					break
+				found.append(fits)
+		if len(found) > 0:
+			found = np.concatenate(found)
+		else:
+			found = np.zeros((0,2),dtype=np.float64)
+		candidates.append((found,pole))
+	return candidates
+
+def parallel_mark_candidates(tasks,jobs):
+	#this function runs mark_candidates for every task
+	#spread over jobs worker processes
+	#tasks is a list of (mark_areas, upper_shape) pairs
+	#it returns the candidates for each task in order
+	if len(tasks) == 0:
+		return list()
+	pool = forked_pool(jobs,tasks=tasks)
+	try:
+		candidates = list(pool.imap(candidate_run,range(len(tasks)),chunk_size(len(tasks),jobs)))
+	finally:
+		pool.close()
+	return candidates
+
+def candidate_run(t):
+	#this function runs in a worker process
+	#it searches the mark areas of one task
+	mark_areas, upper_shape = worker_state['tasks'][t]
+	return mark_candidates(mark_areas,upper_shape,mark_radius)
@@ -0,0 +1,174 @@
+#! /usr/bin/env python
+
+#this script builds an indexed version of an STL mesh
+#an STL file stores every triangle with its own copy of its verticies
+#so the connection between neighbouring triangles is lost
+#welding the duplicate verticies back together gives a
+#vertex/face/edge structure where every edge knows the faces on either side
+#loops can then be traced on a cut plane by walking from face to face
+#instead of matching segment end points by their coordinates
+
+import numpy as np
+
+
+def unique_rows(arr):
+	#this function finds the unique rows of a 2d array
+	#it returns the unique rows in sorted order
+	#and the position of each original row in the unique rows
+	#sorting the columns with lexsort is much quicker
+	#than numpy's unique along an axis for large meshes
+	order = np.lexsort(arr.T[::-1])
+	sorted_arr = arr[order]
+	new_row = np.ones(len(arr),dtype=bool)
+	new_row[1:] = (sorted_arr[1:]!=sorted_arr[:-1]).any(axis=1)
+	inverse = np.empty(len(arr),dtype=np.intp)
+	inverse[order] = np.cumsum(new_row)-1
+	return sorted_arr[new_row], inverse
+
+class mesh_index:
+	def __init__(self,vectors):
+		#vectors is the (n,3,3) triangle array from the mesh
+		vectors = np.asarray(vectors)
+		tri_count = len(vectors)
+		#weld verticies that are exact copies of each other
+		#the copies in an STL file are bit for bit identical
+		#so no tolerance is needed, and near-coincident verticies
+		#that belong to different surfaces stay apart
+		vertices, faces = unique_rows(vectors.reshape(-1,3))
+		self.vertices = vertices.astype(np.float64)
+		self.faces = faces.reshape(tri_count,3)
+
+		#triangles that collapse to a line after welding have no area
+		#and take no part in the edge structure
+		f = self.faces
+		self.valid = (f[:,0]!=f[:,1]) & (f[:,1]!=f[:,2]) & (f[:,2]!=f[:,0])
+
+		#edge j of a face runs from vertex j to vertex j+1
+		#store each edge with the lower vertex number first
+		#so both faces that share it find the same edge
+		pairs = np.stack((f,np.roll(f,-1,axis=1)),axis=2)
+		pairs.sort(axis=2)
+		self.edges, edge_num = unique_rows(pairs[self.valid].reshape(-1,2))
+		self.face_edges = np.full((tri_count,3),-1,dtype=np.intp)
+		self.face_edges[self.valid] = edge_num.reshape(-1,3)
+
+		#find the faces on either side of every edge
+		#-1 marks a missing neighbour
+		edge_count = np.bincount(edge_num,minlength=len(self.edges))
+		self.edge_count = edge_count
+		#a closed mesh has exactly two faces on every edge
+		self.manifold = bool((edge_count==2).all())
+		order = np.argsort(edge_num,kind='mergesort')
+		face_num = np.repeat(np.nonzero(self.valid)[0],3)[order]
+		first = np.concatenate(([0],np.cumsum(edge_count)[:-1]))
+		self.edge_faces = np.full((len(self.edges),2),-1,dtype=np.intp)
+		self.edge_faces[:,0] = face_num[first]
+		has_second = edge_count>1
+		self.edge_faces[has_second,1] = face_num[first[has_second]+1]
+
+	def closed_at(self,cut_heights):
+		#this function checks that every edge that reaches one of the cut planes
+		#has exactly two faces, so the loops on those planes can be walked
+		#the facets only need to be closed where the planes cut them
+		#so this holds for a band of a closed mesh cut out around its planes
+		heights = np.sort(np.asarray(cut_heights,dtype=np.float64))
+		edge_z = self.vertices[self.edges,2]
+		#an edge reaches a plane if a height lies between its ends
+		first = np.searchsorted(heights,edge_z.min(axis=1),side='left')
+		last = np.searchsorted(heights,edge_z.max(axis=1),side='right')
+		reach = first < last
+		return bool((self.edge_count[reach]==2).all())
+
+	def trace_loops(self,cut_z,faces):
+		#this function traces every loop where the mesh crosses the plane at cut_z
+		#faces is an array of the face numbers that may touch the plane
+		#it returns a list of (n,2) point arrays, one per loop
+		#
+		#every vertex is put either below the plane or on/above it
+		#so a face crosses the plane on exactly two of its edges or on none
+		#a vertex that sits on the plane is shared by the two crossing edges
+		#next to it, so nothing is lost by counting it as above
+		#but a vertex on the plane that every face around it only touches,
+		#like the tip of a cone, would be walked around as a loop of one point
+		#so the same as in classify_triangles,
+		#faces that meet the plane only at such a vertex are left out
+		#a vertex that is also part of a face that crosses the plane some other way
+		#still needs its faces to walk through, so those are kept
+		faces = np.asarray(faces)
+		faces = faces[self.valid[faces]]
+		face_z = self.vertices[self.faces[faces],2]
+		above = face_z>=cut_z
+		crossing = above.any(axis=1) & ~above.all(axis=1)
+		on_plane = face_z==cut_z
+		touching = (on_plane.sum(axis=1)==1) & ~(face_z>cut_z).any(axis=1)
+		if touching.any():
+			face_verts = self.faces[faces]
+			#mark the verticies on the plane that belong to any other kind of face
+			walked = np.zeros(len(self.vertices),dtype=bool)
+			walked[face_verts[~touching][on_plane[~touching]]] = True
+			tip = face_verts[touching][on_plane[touching]]
+			crossing[np.flatnonzero(touching)[~walked[tip]]] = False
+		faces = faces[crossing]
+		above = above[crossing]
+		#edge j crosses when its two verticies are on opposite sides
+		#list the edge that goes from above to below first
+		#and the edge that goes from below to above second
+		#on a mesh with consistent winding, the loop then always
+		#leaves a face through its second edge and enters the next face
+		#through its first edge, so outer contours and holes
+		#come out with opposite directions
+		next_above = np.roll(above,-1,axis=1)
+		down = np.argmax(above & ~next_above,axis=1)
+		up = np.argmax(~above & next_above,axis=1)
+		face_edges = self.face_edges[faces]
+		rows = np.arange(len(faces))
+		cross_edges = np.column_stack((face_edges[rows,down],face_edges[rows,up]))
+		face_pair = dict(zip(faces.tolist(),cross_edges.tolist()))
+
+		#find the point where each crossing edge meets the plane
+		edge_list = np.unique(cross_edges)
+		v1 = self.vertices[self.edges[edge_list,0]]
+		v2 = self.vertices[self.edges[edge_list,1]]
+		z_const = (cut_z-v1[:,2])/(v2[:,2]-v1[:,2])
+		points = v1[:,:2] + z_const[:,None]*(v2[:,:2]-v1[:,:2])
+		edge_point = dict(zip(edge_list.tolist(),[tuple(p) for p in points.tolist()]))
+
+		loop_list = list()
+		visited = set()
+		for start_face in faces.tolist():
+			if start_face in visited:
+				continue
+			visited.add(start_face)
+			start_edge, curr_edge = face_pair[start_face]
+			curr_face = start_face
+			loop = [edge_point[start_edge]]
+			while True:
+				point = edge_point[curr_edge]
+				#two crossing edges that meet at a vertex on the plane
+				#give the same point, only keep it once
+				if point != loop[-1]:
+					loop.append(point)
+				if curr_edge == start_edge:
+					#back to the start, the loop is closed
+					if loop[-1] != loop[0]:
+						loop.append(loop[0])
+					break
+				#step across the edge to the face on the other side
+				next_face = self.edge_faces[curr_edge][0]
+				if next_face == curr_face:
+					next_face = self.edge_faces[curr_edge][1]
+				if next_face not in face_pair or next_face in visited:
+					print "Error! Loop is open at the mesh boundary."
+					break
+				visited.add(next_face)
+				edge_a, edge_b = face_pair[next_face]
+				if edge_a == curr_edge:
+					curr_edge = edge_b
+				else:
+					curr_edge = edge_a
+				curr_face = next_face
+			#a loop that only touches the plane, along an edge or at a vertex,
+			#has no area, so it isn't a loop at all
+			if len(set(loop)) >= 3:
+				loop_list.append(np.array(loop,dtype=np.float64))
+		return loop_list
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+
+#this script writes the layers to OpenSCAD, to preview the finished stack
+#each layer is drawn as one polygon, with a path for every ring,
+#so the holes are cut out and OpenSCAD has one shape per layer to extrude
+#instead of one for every polygon
+#the shape of each layer goes in a module
+#layers with the same shape, as in the straight sides of a part,
+#share one module, so the shape is only written out once
+#the slicer puts points along the straight edges of a layer
+#wherever the edges of the mesh cross it, which differ from layer to layer
+#so each ring is put in a standard form before it is written:
+#rounded, with the points along straight edges taken out,
+#wound the same way, starting from its lowest point
+#and the rings sorted, so layers with the same shape give the same text
+
+import hashlib
+import numpy as np
+
+#the places coordinates are rounded to, a hundred thousandth of a mm
+coord_places = 5
+#the furthest a point can be from the line between its neighbours
+#and still be taken out as part of a straight edge, in mm
+straight_tolerance = 1e-4
+
+
+class openscad_writer:
+	#this class writes the layers to an open file as they are finished
+	#the layers have to be added in order, but OpenSCAD doesn't mind
+	#a module being used before the place it is written
+	#if share_layers is False every layer is written out in full
+	def __init__(self,outfile,thickness,share_layers=True):
+		self.outfile = outfile
+		self.thickness = thickness
+		self.share_layers = share_layers
+		#the module name for each layer shape written so far
+		#keyed by a digest of its text, so the text itself isn't kept
+		self.modules = dict()
+
+	def add_layer(self,i,curr_layer):
+		#write out the polygons of layer i
+		self.outfile.write(self.layer_text(i,curr_layer))
+
+	def layer_text(self,i,curr_layer):
+		#return the text for the polygons of layer i
+		#the text has to be written out in the order the layers are given
+		rings = list()
+		for curr_poly in curr_layer.poly:
+			rings.append(curr_poly.points)
+			rings.extend(curr_poly.holes)
+		polygon_string = rings_to_openscad(rings)
+		if polygon_string == '':
+			#nothing was sliced on this layer
+			return ''
+		place_string = "translate([0,0," + str(i*self.thickness) + "])\n"
+		place_string += "linear_extrude(height=" + str(self.thickness) + ")\n"
+		if not self.share_layers:
+			return place_string + polygon_string + "\n"
+		digest = hashlib.md5(polygon_string).digest()
+		module_name = self.modules.get(digest,'')
+		module_string = ''
+		if module_name == '':
+			#the first layer with this shape
+			module_name = "layer" + str(i)
+			self.modules[digest] = module_name
+			module_string = "module " + module_name + "() {\n" + polygon_string + "}\n"
+		return module_string + place_string + module_name + "();\n\n"
+
+def rings_to_openscad(rings):
+	#take the rings of the polygons on a layer, each outside followed by its holes
+	#return the OpenSCAD command for a polygon with one path for each ring
+	#or '' if none of the rings have any area
+	#a point inside an even number of rings is left out
+	#so the holes are cut from their outside
+	#with an even-odd fill, the order and winding of the rings doesn't matter
+	rings = [standard_ring(ring) for ring in rings]
+	rings = [ring for ring in rings if len(ring) >= 3]
+	if len(rings) == 0:
+		return ''
+	rings.sort(key=lambda ring: ring[0].tolist())
+	point_list = list()
+	path_list = list()
+	start = 0
+	for ring in rings:
+		point_list.append(ring)
+		path_list.append(('%d,' * len(ring))[:-1] % tuple(range(start,start+len(ring))))
+		start += len(ring)
+	points = np.concatenate(point_list)
+	#format every coordinate in one go
+	point_format = '[%.' + str(coord_places) + 'f,%.' + str(coord_places) + 'f],'
+	point_str = (point_format * len(points))[:-1] % tuple(points.ravel().tolist())
+	return "polygon(points=[" + point_str + "],\npaths=[[" + '],['.join(path_list) + "]]);\n"
+
+def standard_ring(ring):
+	#put a ring in its standard form, as an (n,2) array without the closing point
+	#adding zero turns any -0.0 from rounding into 0.0
+	ring = np.round(np.asarray(ring,dtype=np.float64).reshape(-1,2),coord_places) + 0.0
+	#drop repeated points, including the closing point
+	#OpenSCAD closes the path itself
+	keep = (ring != np.roll(ring,-1,axis=0)).any(axis=1)
+	ring = ring[keep]
+	#take out the points that lie on the line between their neighbours
+	#repeat until none are left, in case taking a point out leaves
+	#its neighbour on a straight line
+	while len(ring) >= 3:
+		before = np.roll(ring,1,axis=0)
+		after = np.roll(ring,-1,axis=0)
+		span = after-before
+		offset = ring-before
+		length = np.hypot(span[:,0],span[:,1])
+		cross = np.abs(span[:,0]*offset[:,1]-span[:,1]*offset[:,0])
+		straight = cross <= straight_tolerance*np.maximum(length,1e-12)
+		if not straight.any():
+			break
+		#don't take out two neighbours at once
+		#so the error from each point taken out can't add up
+		remove = straight & ~np.roll(straight,1)
+		if not remove.any():
+			#every point is straight, the ring has no area
+			remove[np.argmax(straight)] = True
+		ring = ring[~remove]
+	if len(ring) < 3:
+		return ring
+	#wind every ring counter-clockwise
+	area = np.sum(ring[:,0]*np.roll(ring[:,1],-1)-np.roll(ring[:,0],-1)*ring[:,1])
+	if area < 0:
+		ring = ring[::-1]
+	#start from the lowest point, then the leftmost
+	first = np.lexsort((ring[:,0],ring[:,1]))[0]
+	return np.roll(ring,-first,axis=0)
@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+
+#this script orders the paths of a layer to cut down the time the laser
+#spends moving between paths without cutting
+#the laser works through the paths of a layer in the order they are written
+#the paths are taken in three passes
+#  engraving first: traces, marks and mark numbers
+#  then the cuts inside a part: holes and cutouts
+#  then the outsides of the parts
+#so every part is still held by the sheet while anything inside it is cut
+#within a pass the paths are put in nearest neighbour order
+#then improved by 2-opt, reversing any run of paths that shortens the travel
+#every path is closed, so the laser ends each one where it started
+#and each path only needs its starting point
+
+import numpy as np
+
+#the order of the passes
+#reference paths, like the mark areas, aren't cut, they just go ahead of the rest
+reference_pass = -1
+engrave_pass = 0
+inner_pass = 1
+outer_pass = 2
+#the most times the 2-opt search goes over the whole pass
+max_passes = 20
+
+
+def order_paths(passes,points,head=(0.0,0.0)):
+	#this function returns the order to write the paths of a layer in
+	#passes holds the pass of each path
+	#points is an (n,2) array with the starting point of each path
+	#head is where the laser starts
+	#paths in the same pass keep their order if nothing can be gained
+	passes = np.asarray(passes)
+	points = np.asarray(points,dtype=np.float64).reshape(-1,2)
+	head = np.asarray(head,dtype=np.float64)
+	start = head
+	order = list()
+	for pass_num in np.unique(passes).tolist():
+		members = np.flatnonzero(passes == pass_num)
+		pass_order = nearest_neighbour(points[members],head)
+		pass_order = two_opt(points[members],pass_order,head)
+		order.extend(members[pass_order].tolist())
+		#the next pass starts where this one ended
+		head = points[order[-1]]
+	#the tour is built pass by pass, so in a rare layer
+	#it can come out longer than the paths in the order they were given
+	given = np.argsort(passes,kind='mergesort').tolist()
+	if travel_length(points,given,start) <= travel_length(points,order,start):
+		return given
+	return order
+
+def nearest_neighbour(points,head):
+	#this function builds a tour of the points starting from head
+	#always going to the closest point not visited yet
+	#the distances to the points are all worked out in one go at each step
+	remaining = np.ones(len(points),dtype=bool)
+	order = list()
+	for step in range(len(points)):
+		dist = np.hypot(points[:,0]-head[0],points[:,1]-head[1])
+		dist[~remaining] = np.inf
+		next_point = int(np.argmin(dist))
+		order.append(next_point)
+		remaining[next_point] = False
+		head = points[next_point]
+	return np.array(order,dtype=np.int64)
+
+def two_opt(points,order,head):
+	#this function improves a tour of the points starting from head
+	#reversing a run of the tour from position i to j swaps the two moves
+	#on either side of it for moves between the ends of the run
+	#every j for a given i is checked at once
+	#and the run that saves the most travel is reversed
+	#the tour doesn't return to the start, so the last run has only one move to swap
+	tour = np.vstack((head.reshape(1,2),points[order]))
+	order = np.array(order,dtype=np.int64)
+	count = len(tour)
+	for pass_num in range(max_passes):
+		improved = False
+		for i in range(1,count-1):
+			before = tour[i-1]
+			first = tour[i]
+			last = tour[i+1:]
+			after = tour[i+2:]
+			old_dist = np.hypot(*(before-first)) + np.append(np.hypot(*(last[:-1]-after).T),0.0)
+			new_dist = np.hypot(*(before-last).T) + np.append(np.hypot(*(first-after).T),0.0)
+			gain = old_dist-new_dist
+			best = int(np.argmax(gain))
+			if gain[best] > 1e-9:
+				#reverse the run from i to j
+				j = i+1+best
+				tour[i:j+1] = tour[i:j+1][::-1].copy()
+				order[i-1:j] = order[i-1:j][::-1].copy()
+				improved = True
+		if not improved:
+			break
+	return order
+
+def travel_length(points,order,head=(0.0,0.0)):
+	#this function returns the distance the laser moves without cutting
+	#going through the paths in order
+	tour = np.vstack((np.asarray(head,dtype=np.float64).reshape(1,2),np.asarray(points,dtype=np.float64).reshape(-1,2)[order]))
+	return float(np.hypot(*(tour[1:]-tour[:-1]).T).sum())
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+
+#this script runs the stages of a job at the same time
+#instead of one after the other
+#each stage hands its results to the next through a bounded queue
+#so a fast stage can only run a few layers ahead of a slow one
+#and memory use stays bounded
+#slicing runs in a child process, as it is all numpy and python work
+#that would otherwise wait on the interpreter lock
+#writing runs in a thread, as it spends much of its time waiting on the disk
+
+import multiprocessing
+import threading
+import traceback
+import Queue
+
+#the most layers a stage can get ahead of the stage after it
+queue_layers = 4
+
+
+def process_stage(source,queue_size):
+	#this generator runs the generator source in a child process
+	#and yields its items in order
+	#the child can run up to queue_size items ahead of the caller
+	#the child is forked, so source doesn't need to be pickled
+	#but each item it yields does
+	queue = multiprocessing.Queue(queue_size)
+	worker = multiprocessing.Process(target=feed_queue,args=(source,queue))
+	worker.start()
+	finished = False
+	try:
+		while True:
+			try:
+				kind, item = queue.get(True,1)
+			except Queue.Empty:
+				if worker.is_alive():
+					continue
+				#the child has stopped, check for anything it sent on the way out
+				try:
+					kind, item = queue.get(False)
+				except Queue.Empty:
+					raise RuntimeError("Error! Pipeline stage stopped without finishing.")
+			if kind == 'item':
+				yield item
+			elif kind == 'error':
+				raise RuntimeError("Error! Pipeline stage failed.\n" + item)
+			else:
+				finished = True
+				break
+	finally:
+		if not finished:
+			#the caller stopped early, the rest of the items aren't needed
+			worker.terminate()
+		worker.join()
+
+def feed_queue(source,queue):
+	#this function runs in the child process of a process_stage
+	try:
+		for item in source:
+			queue.put(('item',item))
+		queue.put(('end',None))
+	except Exception:
+		queue.put(('error',traceback.format_exc()))
+
+class thread_stage:
+	#this class runs a function on each item put into it
+	#in order, in a background thread
+	#each item is a tuple of the arguments for the function
+	#put waits while queue_size items are already waiting
+	def __init__(self,func,queue_size):
+		self.func = func
+		self.queue = Queue.Queue(queue_size)
+		self.error = ''
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def put(self,item):
+		if self.error <> '':
+			#no point in running ahead of a stage that has failed
+			self.close()
+		self.queue.put(item)
+
+	def run(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				break
+			if self.error == '':
+				try:
+					self.func(*item)
+				except Exception:
+					self.error = traceback.format_exc()
+
+	def close(self):
+		#wait for the items already put in to finish
+		if self.thread.is_alive():
+			self.queue.put(None)
+			self.thread.join()
+		if self.error <> '':
+			error = self.error
+			self.error = ''
+			raise RuntimeError("Error! Pipeline stage failed.\n" + error)
+
+class direct_stage:
+	#this class has the same use as thread_stage
+	#but runs the function on each item straight away
+	def __init__(self,func):
+		self.func = func
+
+	def put(self,item):
+		self.func(*item)
+
+	def close(self):
+		pass
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+
+#this script finds the pole of inaccessibility of an area
+#that is the point inside the area that is furthest from its edges,
+#the center of the largest circle that fits inside it
+#the area is covered with square cells
+#the distance at the center of a cell plus half the cell diagonal
+#is the most any point in that cell can reach
+#so cells that can't beat the best point found so far are dropped
+#and the rest are split into four, until the cells are smaller than the precision
+#a point to stay away from can also be given
+#the distance to it counts as one more edge of the area
+
+import heapq
+import math
+import numpy as np
+
+
+class area_distance:
+	def __init__(self,geom,avoid_point='',avoid_radius=0):
+		#geom is a shapely Polygon or MultiPolygon
+		#if avoid_point is given, points within avoid_radius of it
+		#are treated as outside the area
+		rings = list()
+		if geom.type == 'Polygon':
+			polygons = [geom]
+		else:
+			polygons = list(geom)
+		for polygon in polygons:
+			rings.append(polygon.exterior.coords)
+			for interior in polygon.interiors:
+				rings.append(interior.coords)
+		#store every edge of every ring as a start point and a step
+		starts = list()
+		ends = list()
+		for ring in rings:
+			ring = np.array(ring,dtype=np.float64)
+			starts.append(ring[:-1])
+			ends.append(ring[1:])
+		starts = np.concatenate(starts)
+		ends = np.concatenate(ends)
+		self.start_x = starts[:,0]
+		self.start_y = starts[:,1]
+		self.end_y = ends[:,1]
+		self.step_x = ends[:,0]-starts[:,0]
+		self.step_y = ends[:,1]-starts[:,1]
+		self.step_len2 = self.step_x*self.step_x + self.step_y*self.step_y
+		#edges of no length are only ever measured from their start point
+		self.step_len2[self.step_len2==0] = 1
+		self.avoid_point = avoid_point
+		self.avoid_radius = avoid_radius
+
+	def __call__(self,x,y):
+		#return the signed distance from each point in x,y to the edges
+		#positive inside the area, negative outside
+		x = np.asarray(x,dtype=np.float64)[:,None]
+		y = np.asarray(y,dtype=np.float64)[:,None]
+		rel_x = x-self.start_x
+		rel_y = y-self.start_y
+		#nearest point on each edge
+		t = np.clip((rel_x*self.step_x + rel_y*self.step_y)/self.step_len2,0,1)
+		off_x = rel_x - t*self.step_x
+		off_y = rel_y - t*self.step_y
+		dist = np.sqrt((off_x*off_x + off_y*off_y).min(axis=1))
+		#count the edges crossed by a ray to the right of each point
+		#an odd count means the point is inside
+		spans = (self.start_y > y) != (self.end_y > y)
+		with np.errstate(divide='ignore',invalid='ignore'):
+			cross_x = self.start_x + self.step_x*(y-self.start_y)/self.step_y
+		crossings = np.count_nonzero(spans & (x < cross_x),axis=1)
+		dist = np.where(crossings%2==1,dist,-dist)
+		if self.avoid_point <> '':
+			avoid_dist = np.hypot(x[:,0]-self.avoid_point.x,y[:,0]-self.avoid_point.y)
+			dist = np.minimum(dist,avoid_dist-self.avoid_radius)
+		return dist
+
+def pole_of_inaccessibility(geom,precision,avoid_point='',avoid_radius=0,min_dist='',max_cells=20000):
+	#find the point of geom furthest from its edges, to within precision
+	#returns (x, y, distance), or '' if no point can reach min_dist
+	#the search measures no more than max_cells cells, counting the first grid,
+	#so it always ends in bounded time and returns the best point found by then
+	if geom.is_empty or geom.area == 0:
+		return ''
+	distance = area_distance(geom,avoid_point,avoid_radius)
+	min_x, min_y, max_x, max_y = geom.bounds
+	#the cells start as wide as the narrow side of the bounds
+	#a long thin area would need a great many of them
+	#so they are made larger until the first grid takes no more than
+	#a quarter of max_cells, leaving the rest for splitting them
+	cell_size = min(max_x-min_x,max_y-min_y)
+	while math.ceil((max_x-min_x)/cell_size)*math.ceil((max_y-min_y)/cell_size) > max_cells//4:
+		cell_size *= 2
+	half = cell_size/2
+	half_diag = math.sqrt(2)
+
+	#the best point starts at the centroid
+	centroid = geom.centroid
+	best_dist = distance([centroid.x],[centroid.y])[0]
+	best = (centroid.x,centroid.y,best_dist)
+
+	#cover the bounds with square cells
+	cell_x, cell_y = np.meshgrid(np.arange(min_x,max_x,cell_size)+half,np.arange(min_y,max_y,cell_size)+half)
+	cell_x = cell_x.ravel()
+	cell_y = cell_y.ravel()
+	cell_dist = distance(cell_x,cell_y)
+	#cells are kept in a heap, ordered by the best distance they could hold
+	#heapq keeps the smallest first, so the key is negated
+	queue = list()
+	for x,y,dist in zip(cell_x.tolist(),cell_y.tolist(),cell_dist.tolist()):
+		heapq.heappush(queue,(-(dist+half*half_diag),x,y,half,dist))
+	cell_count = len(cell_x)
+
+	while queue and cell_count+4 <= max_cells:
+		cell_max, x, y, half, dist = heapq.heappop(queue)
+		cell_max = -cell_max
+		if min_dist <> '' and cell_max < min_dist:
+			#no cell that is left can reach min_dist
+			break
+		if dist > best[2]:
+			best = (x,y,dist)
+		if cell_max - best[2] <= precision:
+			#the cells that are left can't do much better than the best point
+			#and they are all behind this one in the queue
+			break
+		#split the cell into four
+		half = half/2
+		child_x = np.array([x-half,x+half,x-half,x+half])
+		child_y = np.array([y-half,y-half,y+half,y+half])
+		child_dist = distance(child_x,child_y)
+		cell_count += 4
+		for x,y,dist in zip(child_x.tolist(),child_y.tolist(),child_dist.tolist()):
+			if dist+half*half_diag > best[2]:
+				heapq.heappush(queue,(-(dist+half*half_diag),x,y,half,dist))
+
+	if min_dist <> '' and best[2] < min_dist:
+		return ''
+	return best
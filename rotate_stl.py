@@ -4,6 +4,7 @@
 
 from stl import mesh
 import math
+import numpy as np
 from stl_prep import stl_prep
 
 def get_bounds(mesh):
@@ -17,6 +18,18 @@ def get_bounds(mesh):
 	return widths
 	
 
+def euler_matrix(euler_angle):
+	#combine the z-x-z extrinsic euler rotation (in degrees)
+	#into a single rotation matrix
+	#numpy-stl rotates the verticies as rows, v.dot(matrix)
+	#so applying rotations one after another is the same as
+	#applying the product of their matrices in the same order
+	rotation = np.identity(3)
+	for axis, angle in zip(([0.0,0.0,1.0],[1.0,0.0,0.0],[0.0,0.0,1.0]),euler_angle):
+		if angle:
+			rotation = rotation.dot(mesh.Mesh.rotation_matrix(axis,math.radians(angle)))
+	return rotation
+	
 def rotate_stl(inputs):
 	#and rotate it about a given euler angle
 	#the euler angle will be a z-x-z extrinsic rotation
@@ -26,10 +39,12 @@ def rotate_stl(inputs):
 	centered_mesh = inputs.current_mesh
 	#rotate around euler angle
 	#z-x-z extrinsic rotation
-	centered_mesh.rotate([0.0,0.0,1.0],math.radians(inputs.euler_angle[0]))
-	centered_mesh.rotate([1.0,0.0,0.0],math.radians(inputs.euler_angle[1]))
-	centered_mesh.rotate([0.0,0.0,1.0],math.radians(inputs.euler_angle[2]))
+	#the three rotations are combined so every vertex is only moved once
+	centered_mesh.rotate_using_matrix(euler_matrix(inputs.euler_angle))
 	#after rotating objects, we need to recenter
+	#the bounds the mesh has stored are from before the rotation
+	centered_mesh.update_min()
+	centered_mesh.update_max()
 	stl_prep(inputs)
 	centered_mesh.update_min()
 	centered_mesh.update_max()
@@ -49,7 +64,10 @@ def orient_stl(inputs):
 	#about the global z axis
 	#then rotate it 90 degrees about the x axis and save
 	centered_mesh = inputs.current_mesh
-	centered_mesh.rotate([0.0,0.0,1.0],math.radians(inputs.orient))
-	centered_mesh.rotate([1.0,0.0,0.0],math.radians(90))
+	rotation = mesh.Mesh.rotation_matrix([0.0,0.0,1.0],math.radians(inputs.orient))
+	rotation = rotation.dot(mesh.Mesh.rotation_matrix([1.0,0.0,0.0],math.radians(90)))
+	centered_mesh.rotate_using_matrix(rotation)
+	centered_mesh.update_min()
+	centered_mesh.update_max()
 	#centered_mesh.save(inputs.inputfile)
 	return get_bounds(centered_mesh)
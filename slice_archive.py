@@ -0,0 +1,237 @@
+#! /usr/bin/env python
+
+#this script reads and writes slice archives
+#a slice archive holds a finished job in binary form:
+#the polygons of every layer with their holes,
+#and the traces, mark areas, marks and cutouts of each polygon
+#every kind of geometry is packed into flat arrays
+#  <kind>_coords  every point of every ring, one after the other
+#  <kind>_rings   where each ring starts in the coords
+#  <kind>_shapes  where each shape starts in the rings
+#  <kind>_polys   where the shapes of each polygon start
+#each offset array has one extra entry at the end for the total
+#layer_polys holds where the polygons of each layer start
+#mark_points holds the mark point of each polygon, nan if it has none
+#the archive is an uncompressed .npz file, so numpy can read it as usual
+#but each array also sits whole in the file,
+#so it can be memory mapped, and one layer can be read
+#without reading the rest of the file
+
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import numpy as np
+
+#the kinds of geometry kept for each polygon
+archive_kinds = ('poly','trace','mark_area','mark','cutout')
+
+
+class archive_writer:
+	#this class writes the layers of a job to a slice archive as they are finished
+	#each array is written to its own spill file as the layers are added
+	#so only the layer being added is held in memory
+	#when the archive is closed, the spill files are copied into it
+	def __init__(self,filename,width,height,thickness):
+		self.filename = filename
+		self.info = np.array([width,height,thickness],dtype=np.float64)
+		self.spill_dir = tempfile.mkdtemp(prefix='staka_vido_archive_')
+		self.arrays = dict()
+		self.totals = dict()
+		self.add_array('layer_polys',np.int64,())
+		self.add_array('mark_points',np.float64,(2,))
+		for kind in archive_kinds:
+			self.add_array(kind + '_coords',np.float64,(2,))
+			for part in ('_rings','_shapes','_polys'):
+				self.add_array(kind + part,np.int64,())
+
+	def add_array(self,name,dtype,row_shape):
+		self.arrays[name] = spill_array(os.path.join(self.spill_dir,name),dtype,row_shape)
+		if row_shape == ():
+			#every offset array starts at zero
+			self.totals[name] = 0
+			self.arrays[name].append([0])
+
+	def add_offset(self,name,size):
+		#add the start of the next entry to an offset array
+		self.totals[name] += size
+		self.arrays[name].append([self.totals[name]])
+
+	def add_layer(self,curr_layer):
+		#pack the polygons of the next layer
+		self.add_packed(pack_layer(curr_layer))
+
+	def add_packed(self,packed):
+		#add a layer already packed by pack_layer
+		for poly_shapes in packed:
+			for kind in archive_kinds:
+				self.add_shapes(kind,poly_shapes[kind])
+			self.arrays['mark_points'].append([poly_shapes['mark_point']])
+		self.add_offset('layer_polys',len(packed))
+
+	def add_shapes(self,kind,shapes):
+		#add the shapes of one polygon
+		#each shape is a list of rings, the outside first
+		for rings in shapes:
+			for ring in rings:
+				ring = np.asarray(ring,dtype=np.float64).reshape(-1,2)
+				self.arrays[kind + '_coords'].append(ring)
+				self.add_offset(kind + '_rings',len(ring))
+			self.add_offset(kind + '_shapes',len(rings))
+		self.add_offset(kind + '_polys',len(shapes))
+
+	def close(self):
+		#write the archive, then remove the spill files
+		#the arrays are stored without compressing them
+		#which is what lets them be memory mapped
+		try:
+			with zipfile.ZipFile(self.filename,'w',zipfile.ZIP_STORED,allowZip64=True) as archive:
+				info_path = os.path.join(self.spill_dir,'info.npy')
+				np.save(info_path,self.info)
+				archive.write(info_path,'info.npy')
+				for name in sorted(self.arrays.keys()):
+					npy_path = self.arrays[name].finish()
+					archive.write(npy_path,name + '.npy')
+					os.remove(npy_path)
+		finally:
+			self.discard()
+
+	def discard(self):
+		#remove the spill files without writing the archive
+		for spill in self.arrays.values():
+			spill.close()
+		if os.path.isdir(self.spill_dir):
+			shutil.rmtree(self.spill_dir)
+
+class spill_array:
+	#this class builds a numpy array on disk, a block of rows at a time
+	#finish turns it into a .npy file
+	def __init__(self,path,dtype,row_shape):
+		self.path = path
+		self.dtype = np.dtype(dtype)
+		self.row_shape = row_shape
+		self.rows = 0
+		self.outfile = open(path + '.raw','wb')
+
+	def append(self,rows):
+		rows = np.asarray(rows,dtype=self.dtype).reshape((-1,) + self.row_shape)
+		rows.tofile(self.outfile)
+		self.rows += len(rows)
+
+	def finish(self):
+		#write the .npy header, then copy the rows in after it
+		#returns the path of the .npy file
+		self.outfile.close()
+		header = {'descr':np.lib.format.dtype_to_descr(self.dtype),
+				  'fortran_order':False,
+				  'shape':(self.rows,) + self.row_shape}
+		npy_path = self.path + '.npy'
+		with open(npy_path,'wb') as npyfile:
+			np.lib.format.write_array_header_1_0(npyfile,header)
+			with open(self.path + '.raw','rb') as rawfile:
+				shutil.copyfileobj(rawfile,npyfile,1 << 20)
+		os.remove(self.path + '.raw')
+		return npy_path
+
+	def close(self):
+		if not self.outfile.closed:
+			self.outfile.close()
+
+class slice_archive:
+	#this class reads a slice archive
+	#the arrays are memory mapped, so opening the archive reads
+	#almost nothing, and each layer only reads the parts of the file it uses
+	def __init__(self,filename):
+		self.arrays = map_arrays(filename)
+		self.width, self.height, self.thickness = self.arrays['info'].tolist()
+		self.layer_count = len(self.arrays['layer_polys'])-1
+
+	def poly_range(self,i):
+		#the numbers of the polygons on layer i
+		layer_polys = self.arrays['layer_polys']
+		return range(layer_polys[i],layer_polys[i+1])
+
+	def shapes(self,kind,poly_num):
+		#return the shapes of one kind for polygon poly_num
+		#each shape is a list of (n,2) ring arrays, the outside first
+		coords = self.arrays[kind + '_coords']
+		rings = self.arrays[kind + '_rings']
+		shapes = self.arrays[kind + '_shapes']
+		polys = self.arrays[kind + '_polys']
+		shape_list = list()
+		for shape_num in range(polys[poly_num],polys[poly_num+1]):
+			shape_list.append([coords[rings[j]:rings[j+1]] for j in range(shapes[shape_num],shapes[shape_num+1])])
+		return shape_list
+
+	def layer(self,i):
+		#return the shapes of every kind for the polygons of layer i
+		#as a list with a dictionary for each polygon
+		#keyed by kind, plus the mark point as an (x,y) pair,
+		#or 'dummy' if the polygon has no mark
+		layer_list = list()
+		for poly_num in self.poly_range(i):
+			poly_shapes = dict()
+			for kind in archive_kinds:
+				poly_shapes[kind] = self.shapes(kind,poly_num)
+			mark_point = self.arrays['mark_points'][poly_num]
+			if np.isnan(mark_point).any():
+				poly_shapes['mark_point'] = 'dummy'
+			else:
+				poly_shapes['mark_point'] = tuple(mark_point.tolist())
+			layer_list.append(poly_shapes)
+		return layer_list
+
+def pack_layer(curr_layer):
+	#copy the polygons of a layer out into plain arrays
+	#as a list with a dictionary for each polygon, the same as slice_archive.layer
+	#but with nan for the mark point of a polygon with no mark
+	#the packed layer holds no shapely objects
+	#so it can be handed to another thread
+	packed = list()
+	for curr_poly in curr_layer.poly:
+		poly_shapes = dict()
+		poly_shapes['poly'] = [[curr_poly.points] + curr_poly.holes]
+		poly_shapes['trace'] = [shape_rings(trace) for trace in curr_poly.traces]
+		poly_shapes['mark_area'] = [shape_rings(mark_area) for mark_area in curr_poly.mark_areas]
+		poly_shapes['mark'] = [[curr_mark] for curr_mark in curr_poly.mark]
+		poly_shapes['cutout'] = [[curr_cutout] for curr_cutout in curr_poly.cutout]
+		if curr_poly.mark_point == 'dummy':
+			poly_shapes['mark_point'] = (np.nan,np.nan)
+		else:
+			poly_shapes['mark_point'] = (curr_poly.mark_point.x,curr_poly.mark_point.y)
+		packed.append(poly_shapes)
+	return packed
+
+def shape_rings(shape):
+	#the rings of a shapely polygon as arrays, the outside first
+	return [np.array(shape.exterior.coords)] + [np.array(interior.coords) for interior in shape.interiors]
+
+def map_arrays(filename):
+	#memory map every array stored in an uncompressed .npz file
+	#returns a dictionary of the arrays by name
+	arrays = dict()
+	with zipfile.ZipFile(filename) as archive:
+		members = archive.infolist()
+	with open(filename,'rb') as infile:
+		for member in members:
+			if member.compress_type <> zipfile.ZIP_STORED:
+				raise ValueError("Slice archive member " + member.filename + " is compressed")
+			#skip the local file header to get to the .npy data
+			infile.seek(member.header_offset)
+			header = infile.read(30)
+			name_size, extra_size = struct.unpack('<HH',header[26:30])
+			infile.seek(member.header_offset + 30 + name_size + extra_size)
+			version = np.lib.format.read_magic(infile)
+			if version == (1,0):
+				shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(infile)
+			else:
+				shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(infile)
+			name = member.filename[:-len('.npy')]
+			if int(np.prod(shape)) == 0:
+				#an empty file can't be mapped
+				arrays[name] = np.zeros(shape,dtype=dtype)
+			else:
+				order = 'F' if fortran_order else 'C'
+				arrays[name] = np.memmap(filename,dtype=dtype,mode='r',offset=infile.tell(),shape=shape,order=order)
+	return arrays
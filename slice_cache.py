@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+
+#this script keeps a cache of sliced layers on disk
+#slicing only depends on the STL file, the rotation, the thickness,
+#the matching error and whether the mesh is streamed
+#so a run that changes only the output options
+#can load the loops for every layer instead of slicing again
+#each cache entry is named by a hash of those values
+#and holds the loops of every layer packed into flat arrays
+#when the cache grows past its size limit
+#the entries that were used longest ago are removed
+
+import os
+import hashlib
+import zipfile
+import numpy as np
+
+#the version of the slicer and of the entry format
+#change this whenever the loops the slicer gives back change,
+#in their points, their order or how they are packed,
+#so entries written by older code are never loaded
+slice_version = 3
+
+
+def slice_key(inputs):
+	#build the hash that names the cache entry for these inputs
+	key = hashlib.sha1()
+	key.update('slice_version ' + str(slice_version) + '\n')
+	with open(inputs.inputfile,'rb') as infile:
+		#read the file in blocks so large STL files aren't loaded twice
+		block = infile.read(1 << 20)
+		while block:
+			key.update(block)
+			block = infile.read(1 << 20)
+	key.update(repr(tuple(inputs.euler_angle)))
+	key.update(repr(float(inputs.thickness)))
+	key.update(repr(float(inputs.max_error)))
+	#the streaming slicer cuts the mesh into bands before slicing it
+	#so it can fall back to matching segments where slicing the whole mesh wouldn't
+	#keep the loops of the two apart
+	if inputs.stream_stl:
+		key.update('stream')
+	else:
+		key.update('memory')
+	return key.hexdigest()
+
+def cache_path(inputs,key):
+	return os.path.join(inputs.cache_dir,key + '.npz')
+
+def load_slices(inputs,key):
+	#return the list of layers stored under key
+	#each layer is a list of (n,2) loop arrays
+	#returns None if there is no entry for key
+	path = cache_path(inputs,key)
+	if not os.path.exists(path):
+		return None
+	try:
+		with np.load(path) as data:
+			layers = unpack_layers(data['coords'],data['loop_offsets'],data['layer_offsets'])
+	except (IOError,KeyError,ValueError,zipfile.BadZipfile):
+		print "Unable to read slice cache entry " + path
+		return None
+	#mark the entry as recently used
+	os.utime(path,None)
+	return layers
+
+def store_slices(inputs,key,layers):
+	#store the layers under key, then trim the cache to its size limit
+	if not os.path.isdir(inputs.cache_dir):
+		os.makedirs(inputs.cache_dir)
+	coords, loop_offsets, layer_offsets = pack_layers(layers)
+	path = cache_path(inputs,key)
+	#write to a temporary name first so a run that is stopped part way
+	#never leaves a broken entry behind
+	temp_path = path + '.tmp'
+	with open(temp_path,'wb') as outfile:
+		np.savez_compressed(outfile,coords=coords,loop_offsets=loop_offsets,layer_offsets=layer_offsets)
+	os.rename(temp_path,path)
+	trim_cache(inputs.cache_dir,inputs.cache_size*1024*1024)
+
+def trim_cache(cache_dir,max_bytes):
+	#remove the least recently used entries until the cache fits in max_bytes
+	entries = list()
+	for name in os.listdir(cache_dir):
+		if name.endswith('.npz'):
+			path = os.path.join(cache_dir,name)
+			stat = os.stat(path)
+			entries.append((stat.st_mtime,stat.st_size,path))
+	entries.sort()
+	total = sum([size for used,size,path in entries])
+	for used,size,path in entries:
+		if total <= max_bytes:
+			break
+		os.remove(path)
+		total -= size
+
+def pack_layers(layers):
+	#pack a list of layers into three flat arrays
+	#coords holds every point of every loop, one after the other
+	#loop_offsets[j] is where loop j starts in coords
+	#layer_offsets[i] is where layer i starts in the loops
+	#both offset arrays have one extra entry at the end for the total
+	loops = [loop for layer_loops in layers for loop in layer_loops]
+	loop_sizes = [len(loop) for loop in loops]
+	loop_offsets = np.concatenate(([0],np.cumsum(loop_sizes))).astype(np.int64)
+	layer_sizes = [len(layer_loops) for layer_loops in layers]
+	layer_offsets = np.concatenate(([0],np.cumsum(layer_sizes))).astype(np.int64)
+	if len(loops) > 0:
+		coords = np.concatenate(loops).astype(np.float64)
+	else:
+		coords = np.zeros((0,2))
+	return coords, loop_offsets, layer_offsets
+
+def unpack_layers(coords,loop_offsets,layer_offsets):
+	#undo pack_layers, returning a list of layers of (n,2) loop arrays
+	loops = [coords[loop_offsets[j]:loop_offsets[j+1]] for j in range(len(loop_offsets)-1)]
+	return [loops[layer_offsets[i]:layer_offsets[i+1]] for i in range(len(layer_offsets)-1)]
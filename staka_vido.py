@@ -3,15 +3,29 @@
 #take command line inputs, and call appropriate subroutines
 
 import sys
+import os
 import getopt
 import string
 import math
+import numpy as np
 from stl import mesh
 from stl_prep import stl_prep
 from shapely.geometry import Polygon, LineString, Point
+from shapely.prepared import prep
 from hersheydata import font_data
 from rotate_stl import rotate_stl, orient_stl
-from layermaker import call_layermaker
+from layermaker import sweep_layermaker, parallel_layermaker
+from mesh_index import mesh_index
+from slice_cache import slice_key, load_slices, store_slices
+from stl_stream import stl_stream, is_binary_stl
+from polylabel import pole_of_inaccessibility
+from layer_geometry import shape_index, pair_traces, pair_mark_areas, parallel_layer_geometry
+from marker_search import mark_radius, area_search_points, fitting_points, parallel_mark_candidates
+from pipeline import process_stage, thread_stage, direct_stage, queue_layers
+from slice_archive import archive_writer, pack_layer
+from svg_import import svg_import
+from openscad_writer import openscad_writer
+from path_order import order_paths, travel_length, reference_pass, engrave_pass, inner_pass, outer_pass
 
 
 ##################################################
@@ -19,6 +33,9 @@ from layermaker import call_layermaker
 cut_style = '"fill:#ffffff;stroke:#000000;stroke-opacity:1;stroke-width:0.1;stroke-miterlimit:4;stroke-dasharray:none;fill-opacity:1"'
 layer_style = '"stroke-width:0.1;stroke-miterlimit:4;stroke-dasharray:none;stroke:#000000;stroke-opacity:1;fill:#ffffff;fill-opacity:1"'
 trace_style = '"fill:none;stroke:#00ffff;stroke-opacity:1;stroke-width:0.1;stroke-miterlimit:4;stroke-dasharray:none;fill-opacity:0"'
+#when the paths are ordered for the laser, the parts are drawn after what is inside them
+#so they are left unfilled to keep from covering it
+order_cut_style = '"fill:none;stroke:#000000;stroke-opacity:1;stroke-width:0.1;stroke-miterlimit:4;stroke-dasharray:none;fill-opacity:0"'
 mark_area_style = '"fill:#ffffff;stroke:#ff00ff;stroke-opacity:1;stroke-width:0.1;stroke-miterlimit:4;stroke-dasharray:none;fill-opacity:1"'
 
 
@@ -41,14 +58,28 @@ class input_class:
 		self.mark_areas = False
 		self.openscad = False
 		self.max_error = ''
+		self.jobs = 1
+		self.use_cache = True
+		self.cache_dir = os.path.join(os.path.expanduser('~'),'.staka_vido_cache')
+		self.cache_size = 1024 #MB
+		self.stream_stl = False
+		self.stream_layers = False
+		self.pipeline = False
+		self.archive = False
+		self.resume = ''
+		self.scad_modules = True
+		self.order_paths = False
 		self.current_mesh=''
+		self.mesh_index=''
 		self.def_max_error = 1e-6 #maximum error for matching nodes 
 		#define a default thickness
 		self.def_thickness = 3.3 #mm
 
-class svg_data:
+class svg_data(object):
 	#this class holds all the information for an SVG document
 	#it contains multiple layer objects
+	#slots keep the many small document objects from each carrying a dictionary
+	__slots__ = ('layer_count','layer','first_line','header','height','width')
 	def __init__(self):
 		self.layer_count = 0
 		self.layer=list()
@@ -61,9 +92,10 @@ class svg_data:
 		self.layer.append(layer_ob)
 		self.layer_count+=1
 
-class layer:
+class layer(object):
 	#this class defines the layer object
 	#each layer will hold one or more objects
+	__slots__ = ('poly_count','poly','style')
 	def __init__(self,style_str):
 		self.poly_count=0
 		self.poly=list()
@@ -73,14 +105,24 @@ class layer:
 		self.poly.append(poly)
 		self.poly_count+=1
 
-class poly:
+class poly(object):
 	#This class defines a polygon object
-	#each poly contains a shapely polygon object
+	#each poly holds the points around the polygon and its holes
 	#and zero to many traces that represent where layers
 	#above rest on the current layer
-	def __init__(self,point_str,style,poly_type):
-		self.point_str = point_str
-		self.shape=Polygon(point_str_to_list(point_str))
+	#the points of all the rings are packed into one array
+	#the shapely polygon is only built when a stage asks for it
+	__slots__ = ('coords','ring_starts','style','type',
+				 'traces','trace_count','mark_areas','mark_count',
+				 'mark_point','mark','cutout',
+				 '_shape','_prepared_shape')
+	def __init__(self,points,style,poly_type,holes=()):
+		#points is an (n,2) array of the x,y points around the polygon
+		#holes is a list of (n,2) arrays, one for each hole in the polygon
+		rings = [np.asarray(ring,dtype=np.float64).reshape(-1,2) for ring in [points] + list(holes)]
+		self.coords = np.concatenate(rings)
+		#ring j is coords[ring_starts[j]:ring_starts[j+1]]
+		self.ring_starts = np.cumsum([0] + [len(ring) for ring in rings])
 		self.style=style
 		self.type = poly_type
 		self.traces = list()
@@ -93,6 +135,39 @@ class poly:
 		self.mark=list()
 		#or have mulitple cutouts if it has multiple polygons below it
 		self.cutout=list()
+		self._shape = None
+		self._prepared_shape = None
+
+	@property
+	def points(self):
+		#the points around the outside of the polygon
+		return self.coords[:self.ring_starts[1]]
+
+	@property
+	def holes(self):
+		#a list with the points around each hole
+		return [self.coords[self.ring_starts[j]:self.ring_starts[j+1]] for j in range(1,len(self.ring_starts)-1)]
+
+	@property
+	def shape(self):
+		#the shapely polygon, built the first time it is needed
+		if self._shape is None:
+			self._shape = Polygon(self.points,self.holes)
+		return self._shape
+
+	@property
+	def prepared_shape(self):
+		#a prepared copy of the shape for repeated containment tests
+		if self._prepared_shape is None:
+			self._prepared_shape = prep(self.shape)
+		return self._prepared_shape
+
+	def release_shapes(self):
+		#drop the shapely objects built from the points
+		#once the stages that need them are done with this polygon
+		#they are built again if anything asks for them later
+		self._shape = None
+		self._prepared_shape = None
 
 	def add_trace(self, geom):
 		#this function adds a shapely geometric object
@@ -112,13 +187,12 @@ class poly:
 		self.mark_count += 1
 		self.mark_areas.append(geom)
 		
-	def add_mark(self,point_str):
-		self.mark.append(point_str)
+	def add_mark(self,points):
+		self.mark.append(points)
 		
-	def add_cutout(self,point_str):
-		self.cutout.append(point_str)
+	def add_cutout(self,points):
+		self.cutout.append(points)
 
-	
 #create a function to extract the size information from the existing file
 def extract_size(line,svg_data):
 	width_start = line.find("width=")+7
@@ -145,45 +219,15 @@ def get_points(line):
 	points = line[points_start:points_end]
 	return points
 	
-def point_list_to_str(point_list):
-	#use this to make an inkscape-compatible string
-	#this should be used to write paths from existing polygons
-	point_str=""
-	for point in point_list:
-		point_str+= str(point[0]) + ',' + str(point[1]) + " "
-
-	#remove the last space as extraneous
-	point_str=point_str[:-1]
-
-	return point_str
-	
 def point_str_to_list(point_str):
 	#this function will create a list of tuples (x,y)
 	#that correspond to the geometry of a polygon
-	#it will take the string, strip off one point at a time
-	#store it in the list, then cut the string to remove the point
-	#it will repeat until the string is empty
-	
+	#points are separated by spaces, and x from y by a comma
 	point_list=list()
-	while len(point_str)>0:
-		#search for the comma that separates the x from the y
-		x_end=point_str.find(',')
-		x=float(point_str[:x_end])
-		#split out the remaining string
-		point_str=point_str[x_end+1:]
-		#search for the space that separates the y from the next coord
-		y_end=point_str.find(' ')
-		#if we return a value, use it
-		#otherwise, we've hit the end of the string, and this is the last coord
-		#use the remaining string
-		if y_end>=0:
-			y=float(point_str[:y_end])
-			point_str=point_str[y_end+1:]
-		else:
-			y=float(point_str)
-			point_str=list()
+	for point in point_str.split():
+		x,y = point.split(',')
 		#take the coordinate pair and add it to the list
-		point_list.append((x,y))
+		point_list.append((float(x),float(y)))
 	return point_list
 	
 def get_mark_areas(layer_collection):
@@ -203,61 +247,45 @@ def get_mark_areas(layer_collection):
 	#that would be visible after assembly
 	
 	#start by going through the layers
-	for i,curr_layer in enumerate(layer_collection.layer):
-		#then search each polygon in the current layer
-		for curr_poly in curr_layer.poly:
-			#check each trace in this polygon
-			for curr_trace in curr_poly.traces:
-				#if we have a trace in this polygon
-				#we need to cycle through all the traces on the layer above
-				#which means cycle through each polygon
-				#then cycle through its traces
-				for check_poly in layer_collection.layer[i+1].poly:
-					#then search through each trace
-					for check_trace in check_poly.traces:
-						mark_area = curr_trace.intersection(check_trace)
-						if mark_area.type == 'Polygon':
-							#only one overlapping area
-							curr_poly.add_mark_area(mark_area)
-						elif mark_area.type == 'MultiPolygon':
-							#in this case, extract each poly separately
-							for part in mark_area:
-								curr_poly.add_mark_area(part)
-							
-						elif mark_area.type == "GeometryCollection":
-							#if it's a geom collection
-							#and len is zero, no issue
-							if len(mark_area) == 0:
-								pass
-							else:
-								print "Error with mark areas.  Geometry Collection Length non-zero"
-						else:
-							print "Trouble with mark area " + mark_area.type
+	#the top layer has no layer above it, so it has no mark areas
+	for i in range(len(layer_collection.layer)-1):
+		get_layer_mark_areas(layer_collection.layer[i],layer_collection.layer[i+1])
+
+def get_layer_mark_areas(curr_layer,layer_above):
+	#this function finds the mark areas of one layer
+	#the traces of both layers must already be found
+	#gather all the traces on the layer above
+	check_traces = [check_trace for check_poly in layer_above.poly
+					for check_trace in check_poly.traces]
+	#then find the mark areas of each polygon in the current layer
+	poly_mark_areas = pair_mark_areas([curr_poly.traces for curr_poly in curr_layer.poly],check_traces)
+	for curr_poly,mark_areas in zip(curr_layer.poly,poly_mark_areas):
+		for mark_area in mark_areas:
+			curr_poly.add_mark_area(mark_area)
 	
 def get_traces(layer_above,layer_below):
 	#this function takes as an input, two layer objects
 	#it will trace the layer above onto the layer below
 	#and clip any excess lines
 	#this will provide alignment lines for stacking the cut objects
-	for curr_poly in layer_below.poly:
-		#start by checking each poly in the lower layer
-		#and see if it interacts with each poly in the upper layer
-		for check_poly in layer_above.poly:
-			if curr_poly.shape.intersects(check_poly.shape):
-				#in this case, the two interact
-				#we will take the intersection of the two
-				#and convert it to a path to draw the boundary
-				trace_poly = curr_poly.shape.intersection(check_poly.shape)
-				if trace_poly.type == 'Polygon':
-					#we make only one path
-					curr_poly.add_trace(trace_poly)
-				elif trace_poly.type == 'MultiPolygon':
-					#in this case, we have a multipolygon
-					#we need to extract each polygon and make a path
-					for part in trace_poly:
-						curr_poly.add_trace(part)
-				else:
-					print "Crazy intersection: " + trace_poly.type
+	poly_traces = pair_traces([curr_poly.shape for curr_poly in layer_below.poly],
+							  [check_poly.shape for check_poly in layer_above.poly])
+	for curr_poly,traces in zip(layer_below.poly,poly_traces):
+		for trace_poly in traces:
+			curr_poly.add_trace(trace_poly)
+	
+def get_layer_geometry(layer_collection,jobs):
+	#this function finds the traces and mark areas of every layer
+	#the same as get_traces and get_mark_areas
+	#but spread over jobs worker processes
+	layer_shapes = [[curr_poly.shape for curr_poly in curr_layer.poly] for curr_layer in layer_collection.layer]
+	layer_traces, layer_mark_areas = parallel_layer_geometry(layer_shapes,jobs)
+	for curr_layer,poly_traces,poly_mark_areas in zip(layer_collection.layer,layer_traces,layer_mark_areas):
+		for curr_poly,traces,mark_areas in zip(curr_layer.poly,poly_traces,poly_mark_areas):
+			for trace_poly in traces:
+				curr_poly.add_trace(trace_poly)
+			for mark_area in mark_areas:
+				curr_poly.add_mark_area(mark_area)
 					
 def draw_mark(lower_poly,upper_poly,test_point,radius):
 	lower_poly.mark_point = test_point
@@ -265,59 +293,22 @@ def draw_mark(lower_poly,upper_poly,test_point,radius):
 	#get the coordinates for the test point
 	cen_x = test_point.bounds[0]
 	cen_y = test_point.bounds[1]
-	#bottom left corner
-	point_str = str(cen_x-radius/2) + ',' + str(cen_y - radius/2) + ' '
-	#bottm right corner
-	point_str += str(cen_x + radius/2) + ',' + str(cen_y - radius/2) + ' '
-	#upper right corner
-	point_str += str(cen_x + radius/2) + ',' + str(cen_y + radius/2) + ' '
-	#top point
-	point_str += str(cen_x) + ',' + str(cen_y + radius) + ' '
-	#top_left corner
-	point_str += str(cen_x - radius/2) + ',' + str(cen_y + radius/2)
-	lower_poly.add_mark(point_str)
-	upper_poly.add_cutout(point_str)
+	mark_points = np.array([
+		#bottom left corner
+		(cen_x - radius/2, cen_y - radius/2),
+		#bottm right corner
+		(cen_x + radius/2, cen_y - radius/2),
+		#upper right corner
+		(cen_x + radius/2, cen_y + radius/2),
+		#top point
+		(cen_x, cen_y + radius),
+		#top_left corner
+		(cen_x - radius/2, cen_y + radius/2)])
+	lower_poly.add_mark(mark_points)
+	upper_poly.add_cutout(mark_points)
 	return
 
 	
-def check_point(lower_poly,upper_poly,curr_area,test_point,radius):
-	#pass in the geometry for testing
-	test_circ = test_point.buffer(radius)
-	if curr_area.contains(test_circ):
-		#in this case, the area around the test point large enough to contain the mark
-		#are completely within current mark area
-		
-		#we have to test to make sure that the mark location on this layer
-		#does not overlap the mark on the layer below
-		#when a mark gets set, we'll set the mark point
-		#on the upper layer at the same point
-		#it is initialized as "dummy"
-		#so if it is "dummy", there is no mark below it
-		#if it is a point, that means there is a mark below it
-		#and we need to make sure that the current circle does NOT contain it
-		if lower_poly.mark_point == "dummy":
-			#in this case, nothing further to check
-			#set the upper layer mark point to the current point
-			#draw_mark(lower_poly,upper_poly,test_point,radius)
-			#once a success is found, exit the for loop
-			return True
-		else:
-			#in this case, there is a mark in the layer below
-			#if the point is within two radii of the test point
-			#then it's too close
-			check_circ = test_point.buffer(2*radius)
-			if check_circ.contains(lower_poly.mark_point):
-				#in this case, too close do nothing
-				pass
-			else:
-				#in this case, not too close
-				#draw the mark
-				#draw_mark(lower_poly,upper_poly,test_point,radius)
-				return True
-	#if all the tests fail, return false, this point won't work
-	return False
-	
-					
 def add_marker(lower_poly,upper_poly):
 	#this function will take a polygon object, look at its mark_area
 	#and place a pentagonal mark in that area, then a hole in the 
@@ -326,7 +317,7 @@ def add_marker(lower_poly,upper_poly):
 	#the search pattern will start at the center of the mark area
 	#and check to see if there is a radius from the base point
 	#that is contained within the mark area
-	radius = 2
+	radius = mark_radius
 	check_area = radius*radius*3.1415
 	for curr_area in lower_poly.mark_areas:
 		#we search through all the mark areas
@@ -338,70 +329,303 @@ def add_marker(lower_poly,upper_poly):
 		#if any mark has an area less than 4*pi, then there's not enough
 		#area for it to be marked
 		if test_area.area > check_area:
+			#first find the point of the mark area furthest from its edges
+			#and from the mark below, the center of the largest mark that fits
+			#if even that point is within one radius of an edge
+			#there is no place for the mark in this area
+			#this is much quicker than searching the whole area to find that out
+			if lower_poly.mark_point == "dummy":
+				pole = pole_of_inaccessibility(curr_area,radius/20.0,min_dist=radius)
+			else:
+				#keep the mark two radii from the mark below
+				pole = pole_of_inaccessibility(curr_area,radius/20.0,lower_poly.mark_point,radius,min_dist=radius)
+			if pole == '':
+				continue
 			#the search pattern for finding a mark point
 			#start at the centroid
 			#if that fails, search on a circle around the centroid
 			#increment by one degree (or one radius, whichever is smaller)
 			#once the radius exceeds the maximum bounds minus the radius
-			#the loop ends in a failure
+			#the search ends, and the mark goes at the pole instead
 			#the test point will start at the centroid
 			
 			
-			#the first point is the centroid
-			test_point = curr_area.centroid
-			#check the centroid first
-			point_found = check_point(lower_poly,upper_poly,curr_area,test_point,radius)
-			if point_found:
-				#if the centroid works
-				#draw the mark and return true
-				draw_mark(lower_poly,upper_poly,test_point,radius)
+			#get every test point of the search inside the mark area
+			#in the order it is searched
+			#the centroid first, then the circles around it
+			search_points = area_search_points(curr_area,test_area,radius)
+			#the mark fits at a point one radius from the edges of the area
+			#and two radii from the mark below
+			#the first point in search order where it fits gets the mark
+			for fits in fitting_points(curr_area,search_points,radius,lower_poly.mark_point):
+				draw_mark(lower_poly,upper_poly,Point(fits[0,0],fits[0,1]),radius)
 				return True
-			#if it doesn't work start the search radius
-			#start by finding the maximum search radius
-			test_bounds = test_area.bounds
-			max_bound = 0
-			for bound in test_bounds:
-				if abs(bound) > max_bound:
-					max_bound = abs(bound)
-			
-			max_bound = max_bound - 2*radius
-			dist = radius
-			#get the coordinates for the centroid (currently test_point)
-			#which will be the center of the search area
-			cen_x = test_point.bounds[0]
-			cen_y = test_point.bounds[1]
-			#while the search radius is less that the maximum
-			while dist < max_bound:
-				del_theta = float(radius)/float(dist)
-				theta = 0
-				while theta < 2*3.1415:
-					#print dist, theta, del_theta
-					#search around the circle
-					test_point = Point(cen_x + dist*math.cos(theta), cen_y + dist*math.sin(theta))
-					if curr_area.contains(test_point):
-						#only check points that are within the current mark area
-						point_found = check_point(lower_poly,upper_poly,curr_area,test_point,radius)
-					else:
-						point_found = False
-					
-					if point_found:
-						#if the test point works, mark and return
-						draw_mark(lower_poly,upper_poly,test_point,radius)
-						return True
-					theta += del_theta
-				#if the current circle doesn't work
-				#increment distance by radius and repeat
-				dist += radius
 			
-			#if the while loop exits
-			#it means we've searched the entire space of the current area
-			#and no point worked, that means there are no points on the current
+			#if the search ends without a point
+			#the pole is still far enough from the edges and the mark below
+			draw_mark(lower_poly,upper_poly,Point(pole[0],pole[1]),radius)
+			return True
 				
 	#at this point, all areas have been checked
 	#if no possible area can be marked
 	#return false
 	return False
 
+def add_layer_markers(lower_layer,upper_layer,i,inputs,mark_candidates=''):
+	#this function places the markers between layer i and the layer above it
+	#each polygon in the upper layer gets a mark on a polygon below it
+	#and a hole to see the mark through
+	#the layers below must already be marked
+	#mark_candidates is '' to search for each mark here
+	#or the candidates found ahead of time by get_mark_candidates
+	if inputs.verbose:
+		print "\nSearching Layer " + str(i) + "====================="
+	poly_count = 1
+	poly_total = len(upper_layer.poly)
+	for upper_num,upper_poly in enumerate(upper_layer.poly):
+		#check each polygon in the upper layer
+		#set a boolean bit to see if the marker is found
+		marker_added = False
+		if inputs.verbose:
+			print "Checking Poly " + str(poly_count) + " of " + str(poly_total)
+		#check to see if this polygon intersects with the mark area
+		#of any polygon on the lower layer
+		for lower_num,lower_poly in enumerate(lower_layer.poly):
+			#a polygon may have one or more mark areas
+			for curr_mark_area in lower_poly.mark_areas:
+				if upper_poly.prepared_shape.intersects(curr_mark_area):
+					#if the upper poly intersects the lower poly's
+					#mark area, then try to add a marker
+					#if it returns true, the marker is added
+					#if it returns false, no marker added
+					if mark_candidates == '':
+						marker_added = add_marker(lower_poly,upper_poly)
+					else:
+						marker_added = resolve_marker(lower_poly,upper_poly,mark_candidates[(i,upper_num,lower_num)])
+				
+				if marker_added:
+					#in this case, a marker has been added to this
+					#upper polygon
+					#do not search more mark areas
+					if inputs.verbose:
+						print "Marker added\n"
+					break
+				
+			if marker_added:
+				#in this case, marker has been added to upper poly
+				#do not search more lower polys
+				break
+				
+		poly_count+=1
+		
+def resolve_marker(lower_poly,upper_poly,candidates):
+	#this function places the mark the same way add_marker does
+	#but from the points found ahead of time by mark_candidates
+	#only the check against the mark below is left to do here
+	radius = mark_radius
+	for curr_area,area_candidates in zip(lower_poly.mark_areas,candidates):
+		if area_candidates == '':
+			#the area is too small for a mark
+			continue
+		found, pole = area_candidates
+		if pole == '':
+			#the mark doesn't fit anywhere in the area
+			continue
+		if lower_poly.mark_point <> "dummy":
+			#the points within two radii of the mark below are too close
+			mark_dist = np.hypot(found[:,0]-lower_poly.mark_point.x,found[:,1]-lower_poly.mark_point.y)
+			found = found[mark_dist >= 2*radius]
+		if len(found) > 0:
+			#the first point left in search order gets the mark
+			draw_mark(lower_poly,upper_poly,Point(found[0,0],found[0,1]),radius)
+			return True
+		#if none of the points work, the mark goes at the pole
+		#found without the mark below, so it has to be found again
+		#keeping two radii from the mark below
+		if lower_poly.mark_point <> "dummy":
+			pole = pole_of_inaccessibility(curr_area,radius/20.0,lower_poly.mark_point,radius,min_dist=radius)
+			if pole == '':
+				continue
+		draw_mark(lower_poly,upper_poly,Point(pole[0],pole[1]),radius)
+		return True
+	return False
+
+def get_mark_candidates(layer_collection,jobs):
+	#this function finds the points where a mark fits
+	#for every pair of polygons the marker search will try
+	#spread over jobs worker processes
+	#it returns the candidates for each pair
+	#keyed by the layer number and the positions of the upper and lower poly
+	keys = list()
+	tasks = list()
+	for i in range(len(layer_collection.layer)-2):
+		for upper_num,upper_poly in enumerate(layer_collection.layer[i+1].poly):
+			for lower_num,lower_poly in enumerate(layer_collection.layer[i].poly):
+				for curr_mark_area in lower_poly.mark_areas:
+					if upper_poly.prepared_shape.intersects(curr_mark_area):
+						keys.append((i,upper_num,lower_num))
+						tasks.append((lower_poly.mark_areas,upper_poly.shape))
+						break
+	return dict(zip(keys,parallel_mark_candidates(tasks,jobs)))
+
+def loop_area(loop):
+	#signed area of a closed (n,2) loop, positive when counter clockwise
+	x = loop[:,0]
+	y = loop[:,1]
+	return (np.dot(x[:-1],y[1:]) - np.dot(x[1:],y[:-1]))/2
+
+def assemble_loops(pointslist):
+	#this function sorts the loops of a layer into polygons with holes
+	#the loops of a slice never cross, so every loop is either
+	#inside another loop or outside it
+	#a loop inside an even number of loops is the outside of a polygon
+	#a loop inside an odd number of loops is a hole
+	#in the smallest loop that holds it
+	#it returns a list of (outside, holes) pairs
+	loops = [np.asarray(loop,dtype=np.float64) for loop in pointslist]
+	areas = [loop_area(loop) for loop in loops]
+	#a loop can only be inside a larger loop
+	#so place the loops from the largest down
+	order = sorted(range(len(loops)),key=lambda j: -abs(areas[j]))
+	rank = dict()
+	for position,j in enumerate(order):
+		rank[j] = position
+	shapes = [Polygon(loop) for loop in loops]
+	loop_index = shape_index(range(len(loops)),shapes)
+	depth = [0]*len(loops)
+	parent = [-1]*len(loops)
+	prepared = dict()
+	for j in order:
+		if areas[j] == 0:
+			#a flat loop can't hold or be held by anything
+			continue
+		#any point inside this loop is inside every loop that holds it
+		test_point = shapes[j].representative_point()
+		for k in loop_index.query(shapes[j]):
+			if rank[k] >= rank[j] or areas[k] == 0:
+				continue
+			if k not in prepared:
+				prepared[k] = prep(shapes[k])
+			if prepared[k].contains(test_point):
+				depth[j] += 1
+				#the smallest loop that holds this one is its parent
+				if parent[j] < 0 or rank[k] > rank[parent[j]]:
+					parent[j] = k
+
+	polygons = list()
+	position = dict()
+	for j in range(len(loops)):
+		if depth[j]%2 == 0:
+			position[j] = len(polygons)
+			polygons.append((loops[j],list()))
+	for j in range(len(loops)):
+		if depth[j]%2 == 1:
+			outside = polygons[position[parent[j]]]
+			hole = loops[j]
+			#wind the hole the other way to its polygon
+			#so the path fills properly in inkscape
+			if (areas[j] > 0) == (loop_area(outside[0]) > 0):
+				hole = hole[::-1]
+			outside[1].append(hole)
+	return polygons
+
+def read_layer(inputs,i,cut_heights,layer_points,svg_data):
+	#report on the loops sliced for layer i and add them to the document
+	print "Cut Plane, Z= ", cut_heights[i]
+	if inputs.verbose:
+		print "Reading layer " + str(i+1) + " of " + str(len(cut_heights))
+	print "Size ", len(layer_points)
+		
+	#write data to data structure
+	if inputs.verbose:
+		print "Pushing data to structure...\n"
+	readlayermaker(layer_points,svg_data)
+
+def write_layer_window(inputs,layer_source,window,cut_heights):
+	#this function builds, marks and writes out the layers as they are sliced
+	#instead of holding the whole document until the end
+	#only a window of the last three layers is kept
+	#the traces of a layer need the layer above it
+	#and its mark areas and markers need the traces of the layer above that
+	#so a layer is finished once the layer two above it is sliced
+	#nothing more is added to it after that
+	#so it is written out and dropped from the window
+	#window is an empty document with its width and height set
+	outfile = open(inputs.outputfile,'w')
+	scadfile = ''
+	scad = ''
+	if inputs.openscad:
+		outname = openscad_name(inputs)
+		print outname
+		scadfile = open(outname,'w')
+		scad = openscad_writer(scadfile,inputs.thickness,inputs.scad_modules)
+	archive = ''
+	if inputs.archive:
+		archive = archive_writer(archive_name(inputs),window.width,window.height,inputs.thickness)
+	if inputs.pipeline:
+		#write the finished layers from a background thread
+		#while the next layers are traced and marked
+		#the thread is only handed text and arrays, never shapely objects
+		layer_writer = thread_stage(write_window_layer,queue_layers)
+	else:
+		layer_writer = direct_stage(write_window_layer)
+	#the layer number of the bottom layer in the window
+	first_layer = 0
+	try:
+		write_inkscape_header(outfile,inputs,window)
+		for i,layer_points in enumerate(layer_source):
+			read_layer(inputs,i,cut_heights,layer_points,window)
+			if len(window.layer) >= 2:
+				#trace the new layer onto the one below it
+				get_traces(window.layer[-1],window.layer[-2])
+			if len(window.layer) == 3:
+				#the bottom layer has everything it needs for its markers
+				get_layer_mark_areas(window.layer[0],window.layer[1])
+				add_layer_markers(window.layer[0],window.layer[1],first_layer,inputs)
+				layer_writer.put(finish_window_layer(outfile,scadfile,scad,archive,inputs,first_layer,window.layer.pop(0)))
+				first_layer += 1
+		#the top two layers have no layer two above them
+		#so they get no mark areas or markers
+		while len(window.layer) > 0:
+			layer_writer.put(finish_window_layer(outfile,scadfile,scad,archive,inputs,first_layer,window.layer.pop(0)))
+			first_layer += 1
+		layer_writer.close()
+		write_inkscape_footer(outfile)
+		if archive <> '':
+			archive.close()
+	finally:
+		layer_writer.close()
+		outfile.close()
+		if scadfile <> '':
+			scadfile.close()
+		if archive <> '':
+			#drop the spill files of an archive that wasn't finished
+			archive.discard()
+
+def finish_window_layer(outfile,scadfile,scad,archive,inputs,layer_num,curr_layer):
+	#turn a finished layer into the text and arrays for the outputs
+	#and return the arguments for write_window_layer
+	#this runs on the main thread, so the writer never touches a shapely object
+	#shapely can't be used from two threads at once
+	for curr_poly in curr_layer.poly:
+		curr_poly.release_shapes()
+	layer_text = inkscape_layer_text(inputs,layer_num,curr_layer)
+	scad_text = ''
+	if scad <> '':
+		scad_text = scad.layer_text(layer_num,curr_layer)
+	packed_layer = ''
+	if archive <> '':
+		packed_layer = pack_layer(curr_layer)
+	return (outfile,scadfile,archive,layer_text,scad_text,packed_layer)
+
+def write_window_layer(outfile,scadfile,archive,layer_text,scad_text,packed_layer):
+	#write a finished layer to the outputs
+	outfile.write(layer_text)
+	if scadfile <> '':
+		scadfile.write(scad_text)
+	if archive <> '':
+		archive.add_packed(packed_layer)
+
 def readlayermaker(pointslist,svg_data):
 	#take the given points lists
 	#process and store into the data structure
@@ -409,11 +633,12 @@ def readlayermaker(pointslist,svg_data):
 	#create a new layer
 	new_layer = layer(layer_style)
 	#each item in the points list collection is one loop
-	#create a polygon for each loop
-	for pointloop in pointslist:
+	#stored as an (n,2) array of points
+	#create a polygon for each outside loop, with the loops inside it as holes
+	for pointloop,holes in assemble_loops(pointslist):
 		#i don't think i was using poly type before
 		#may need to check on this with testing
-		new_poly = poly(pointloop, cut_style,'contour')
+		new_poly = poly(pointloop, cut_style,'contour',holes)
 		#add the poly to the layer
 		new_layer.add_poly(new_poly)
 		
@@ -453,7 +678,7 @@ def read_svg(filepath,svg_data):
 				#create the new poly object
 				#all polys defined in the original document are to be cut
 				#so always use the cut_style
-				new_poly = poly(point_str,cut_style,poly_type)
+				new_poly = poly(point_str_to_list(point_str),cut_style,poly_type)
 				#add the poly object to the layer object
 				new_layer.add_poly(new_poly)
 
@@ -530,161 +755,194 @@ def add_marker_text_inkscape(text_str,test_point):
 	return outstring
 		
 def write_to_inkscape(inputs, svg_data):
-	scale = 3.54331
 	with open(inputs.outputfile, 'w') as outfile:
-		#writout out the header info
-		outfile.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
-		outfile.write('<svg\n' + \
-					  '   xmlns:dc="http://purl.org/dc/elements/1.1/"\n' + \
-					  '   xmlns:cc="http://creativecommons.org/ns#"\n' + \
-					  '   xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n' + \
-					  '   xmlns:svg="http://www.w3.org/2000/svg"\n' + \
-					  '   xmlns="http://www.w3.org/2000/svg"\n' + \
-					  '   xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"\n' + \
-					  '   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"\n' + \
-					  '   width="' + str(scale *svg_data.width) + '"\n' + \
-					  '   height="' + str(scale*svg_data.height) + '"\n' + \
-					  '   id="' + inputs.outputfile + '"\n' + \
-					  '   version="1.1"\n' + \
-					  '   inkscape:version="0.92.2 (5c3e80d, 2017-08-06)"\n' + \
-					  '   sodipodi:docname="' + inputs.outputfile + '">\n' + \
-					  '  <sodipodi:namedview\n' + \
-					  '     pagecolor="#ffffff"\n' + \
-					  '     bordercolor="#666666"\n' + \
-					  '     borderopacity="1"\n' + \
-					  '     objecttolerance="10"\n' + \
-					  '     gridtolerance="10"\n' + \
-					  '     guidetolerance="10"\n' + \
-					  '     inkscape:pageopacity="0"\n' + \
-					  '     inkscape:pageshadow="2"\n' + \
-					  '     inkscape:window-width="1920"\n' + \
-					  '     inkscape:window-height="1005"\n' + \
-					  '     id="namedview5887"\n' + \
-					  '     showgrid="false"\n' + \
-					  '     inkscape:zoom="1.0"\n' + \
-					  '     inkscape:cx="58.152"\n' + \
-					  '     inkscape:cy="261.96802"\n' + \
-					  '     inkscape:window-x="-9"\n' + \
-					  '     inkscape:window-y="-9"\n' + \
-					  '     inkscape:window-maximized="1"\n' + \
-					  '     inkscape:current-layer="layer0" />\n')
+		write_inkscape_header(outfile,inputs,svg_data)
 		for layer_num, curr_layer in enumerate(svg_data.layer):
 			#cycle through each layer
-			#start by writing the appropriate intro information for this layer
-			layer_str=str(layer_num)
-			outfile.write('  <g\n')
-			outfile.write('     inkscape:groupmode="layer"\n')
-			outfile.write('     id="layer' +layer_str +'"\n')
-			outfile.write('     inkscape:label="Layer ' + layer_str+ '">\n')
-
-			#group all polygons in this layer together
-			outfile.write('    <g\n')
-			outfile.write('       id="poly_group' + layer_str + '">\n')
-			for poly_num,curr_poly in enumerate(curr_layer.poly):
-				#go through each polygon in the current layer
-				#then write the appropriate info to the output
-				poly_str=str(poly_num)            
-				outfile.write('      <path\n')
-				outfile.write('         d="M ' + scale_and_flip(curr_poly.point_str) + ' Z"\n')
-				outfile.write('         style=' + curr_poly.style + '/>\n')
-				if inputs.traces:
-					for trace_poly in curr_poly.traces:
-						#include all the traces in the same group
-						outfile.write('      <path\n')
-						outfile.write('         d="M ' + scale_and_flip(point_list_to_str(trace_poly.exterior.coords[:])) + ' Z"\n')
-						outfile.write('         style=' + trace_style + '/>\n')
-				if inputs.mark_areas:   
-					for mark_area in curr_poly.mark_areas:
-						#includethe mark areas, too
-						outfile.write('      <path\n')
-						outfile.write('         d="M ' + scale_and_flip(point_list_to_str(mark_area.exterior.coords[:])) + ' Z"\n')
-						outfile.write('         style=' + mark_area_style + '/>\n')
-						
-					for curr_mark in curr_poly.mark:
-						outfile.write('      <path\n')
-						outfile.write('         d="M ' + scale_and_flip(curr_mark) + ' Z"\n')
-						outfile.write('         style=' + trace_style + '/>\n')
-					
-					for curr_cutout in curr_poly.cutout:
-						outfile.write('      <path\n')
-						outfile.write('         d="M ' + scale_and_flip(curr_cutout) + ' Z"\n')
-						outfile.write('         style=' + cut_style + '/>\n')
-					if curr_poly.mark_point <> "dummy":    
-						outfile.write(add_marker_text_inkscape(layer_str,curr_poly.mark_point))
-						
-			#after writing all the polygons
-			#group close the group around them
-			outfile.write('    </g>\n')
-			#write out the close for the layer
-			outfile.write('  </g>\n')
-		#after writing all the layers
-		#close out the SVG
-		outfile.write('</svg>\n')
+			write_inkscape_layer(outfile,inputs,layer_num,curr_layer)
+		write_inkscape_footer(outfile)
 		outfile.closed 
+
+def write_inkscape_header(outfile,inputs,svg_data):
+	scale = 3.54331
+	#writout out the header info
+	outfile.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+	outfile.write('<svg\n' + \
+				  '   xmlns:dc="http://purl.org/dc/elements/1.1/"\n' + \
+				  '   xmlns:cc="http://creativecommons.org/ns#"\n' + \
+				  '   xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n' + \
+				  '   xmlns:svg="http://www.w3.org/2000/svg"\n' + \
+				  '   xmlns="http://www.w3.org/2000/svg"\n' + \
+				  '   xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"\n' + \
+				  '   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"\n' + \
+				  '   width="' + str(scale *svg_data.width) + '"\n' + \
+				  '   height="' + str(scale*svg_data.height) + '"\n' + \
+				  '   id="' + inputs.outputfile + '"\n' + \
+				  '   version="1.1"\n' + \
+				  '   inkscape:version="0.92.2 (5c3e80d, 2017-08-06)"\n' + \
+				  '   sodipodi:docname="' + inputs.outputfile + '">\n' + \
+				  '  <sodipodi:namedview\n' + \
+				  '     pagecolor="#ffffff"\n' + \
+				  '     bordercolor="#666666"\n' + \
+				  '     borderopacity="1"\n' + \
+				  '     objecttolerance="10"\n' + \
+				  '     gridtolerance="10"\n' + \
+				  '     guidetolerance="10"\n' + \
+				  '     inkscape:pageopacity="0"\n' + \
+				  '     inkscape:pageshadow="2"\n' + \
+				  '     inkscape:window-width="1920"\n' + \
+				  '     inkscape:window-height="1005"\n' + \
+				  '     id="namedview5887"\n' + \
+				  '     showgrid="false"\n' + \
+				  '     inkscape:zoom="1.0"\n' + \
+				  '     inkscape:cx="58.152"\n' + \
+				  '     inkscape:cy="261.96802"\n' + \
+				  '     inkscape:window-x="-9"\n' + \
+				  '     inkscape:window-y="-9"\n' + \
+				  '     inkscape:window-maximized="1"\n' + \
+				  '     inkscape:current-layer="layer0" />\n')
+
+def write_inkscape_layer(outfile,inputs,layer_num,curr_layer):
+	#write out one layer of the document
+	#the layers can be written as soon as they are finished
+	#as long as they are written in order between the header and the footer
+	outfile.write(inkscape_layer_text(inputs,layer_num,curr_layer))
+
+def inkscape_layer_text(inputs,layer_num,curr_layer):
+	#return the text for one layer of the document
+	#the text for the layer is built up in a list
+	#and joined in one go at the end
+	layer_text = list()
+	#start by writing the appropriate intro information for this layer
+	layer_str=str(layer_num)
+	layer_text.append('  <g\n' + \
+					  '     inkscape:groupmode="layer"\n' + \
+					  '     id="layer' +layer_str +'"\n' + \
+					  '     inkscape:label="Layer ' + layer_str+ '">\n')
+
+	#group all polygons in this layer together
+	layer_text.append('    <g\n' + \
+					  '       id="poly_group' + layer_str + '">\n')
+	#each path is kept with the laser pass it belongs to
+	#and the point the laser starts it at
+	paths = list()
+	for poly_num,curr_poly in enumerate(curr_layer.poly):
+		#go through each polygon in the current layer
+		#then write the appropriate info to the output
+		#each path is named by what it is, the layer and the polygon
+		#so the layers can be read back in by svg_import
+		poly_id = layer_str + '_' + str(poly_num)
+		if inputs.order_paths:
+			#the holes are cut on their own, before the outside of the part
+			paths.append((outer_pass,curr_poly.points[0],path_element(rings_to_path([curr_poly.points]),order_cut_style,'poly' + poly_id)))
+			for j,hole in enumerate(curr_poly.holes):
+				paths.append((inner_pass,hole[0],path_element(rings_to_path([hole]),order_cut_style,'poly' + poly_id + '_hole' + str(j))))
+		else:
+			paths.append((outer_pass,curr_poly.points[0],path_element(rings_to_path([curr_poly.points] + curr_poly.holes),curr_poly.style,'poly' + poly_id)))
+		if inputs.traces:
+			for j,trace_poly in enumerate(curr_poly.traces):
+				#include all the traces in the same group
+				paths.append((engrave_pass,trace_poly.exterior.coords[0],path_element(shape_to_path(trace_poly),trace_style,'trace' + poly_id + '_' + str(j))))
+		if inputs.mark_areas:   
+			for j,mark_area in enumerate(curr_poly.mark_areas):
+				#includethe mark areas, too
+				#they are only for reference, so they go ahead of everything the laser does
+				paths.append((reference_pass,mark_area.exterior.coords[0],path_element(shape_to_path(mark_area),mark_area_style,'mark_area' + poly_id + '_' + str(j))))
+				
+			for j,curr_mark in enumerate(curr_poly.mark):
+				paths.append((engrave_pass,curr_mark[0],path_element(rings_to_path([curr_mark]),trace_style,'mark' + poly_id + '_' + str(j))))
+			
+			for j,curr_cutout in enumerate(curr_poly.cutout):
+				if inputs.order_paths:
+					cutout_style = order_cut_style
+				else:
+					cutout_style = cut_style
+				paths.append((inner_pass,curr_cutout[0],path_element(rings_to_path([curr_cutout]),cutout_style,'cutout' + poly_id + '_' + str(j))))
+			if curr_poly.mark_point <> "dummy":    
+				mark_point = (curr_poly.mark_point.x,curr_poly.mark_point.y)
+				paths.append((engrave_pass,mark_point,add_marker_text_inkscape(layer_str,curr_poly.mark_point)))
+	if inputs.order_paths and len(paths) > 0:
+		passes = [path[0] for path in paths]
+		points = [path[1] for path in paths]
+		order = order_paths(passes,points)
+		if inputs.verbose:
+			#compare against the paths taken pass by pass in the order they were found
+			found_order = sorted(range(len(paths)),key=lambda j: passes[j])
+			print "Layer " + layer_str + " travel " + str(int(travel_length(points,found_order))) + \
+				  " mm before ordering, " + str(int(travel_length(points,order))) + " mm after"
+		paths = [paths[j] for j in order]
+	layer_text.extend([path[2] for path in paths])
+				
+	#after writing all the polygons
+	#group close the group around them
+	layer_text.append('    </g>\n')
+	#write out the close for the layer
+	layer_text.append('  </g>\n')
+	return ''.join(layer_text)
+
+def write_inkscape_footer(outfile):
+	#after writing all the layers
+	#close out the SVG
+	outfile.write('</svg>\n')
+
+def path_element(path_str,style,path_id):
+	#make the text for an inkscape path element
+	return '      <path\n         id="' + path_id + '"\n         d="' + path_str + '"\n         style=' + style + '/>\n'
 			 
-def scale_and_flip(point_str):
-	#this function will take a point string
+def rings_to_path(rings):
+	#make an inkscape path with one closed subpath for each ring
+	#the first ring is the outside, the rest are holes
+	return ' '.join(['M ' + scale_and_flip(ring) + ' Z' for ring in rings])
+
+def shape_to_path(shape):
+	#make an inkscape path from a shapely polygon and its holes
+	rings = [shape.exterior.coords] + [interior.coords for interior in shape.interiors]
+	return rings_to_path(rings)
+
+def scale_and_flip(points):
+	#this function will take an (n,2) array of points
 	#and scale and flip it for inkscape
 	#by default, inkscape assumes units are in pixels
 	#and assumes 90 pixels per inch
 	#slicer outputs units in mm
 	#90 ppi/25.4 mm per inch = 3.54331 scaling
 	#inkscape inverts y coordinates, so we need to flip the y coordinate
+	#it returns the points as an inkscape point string
 	scale = 3.54331
-	new_point_str = ""
-	while string.find(point_str,",")>=0:
-		#as long as a comma is in the string
-		#we have at least one more pair of coordinates
-		end_position = string.find(point_str,",")
-		new_x = scale*float(point_str[:end_position])
-		point_str = point_str[end_position+1:]
-		#if there is a space in the string, then there are at least two
-		if string.find(point_str," ") >= 0:
-			end_position = string.find(point_str," ")
-			new_y = -scale*float(point_str[:end_position])
-			point_str = point_str[end_position+1:]
-			new_point_str += str(new_x) + "," + str(new_y) + " "
-		else:
-			#this is the last coordinate
-			new_y = -scale * float(point_str)
-			point_str = ""
-			new_point_str += str(new_x) + "," + str(new_y)
-		
-	return new_point_str
+	points = np.asarray(points,dtype=np.float64).reshape(-1,2)*(scale,-scale)
+	#format every coordinate in one go, to a ten thousandth of a pixel
+	return ('%.4f,%.4f ' * len(points))[:-1] % tuple(points.ravel().tolist())
 	
 def write_to_openscad(inputs,svg_data):
 	#this function will write the output of the slices to OpenSCAD
 	#to allow previewing what the finished shape will look like.
 	#Go through each layer in the SVG data
-	#draw each polygon from from the layer
+	#draw the polygons of the layer as one shape, with their holes
 	#extrude it by the thickness
 	#translate it to the correct height
-	outname = inputs.outputfile[:-4] + ".scad"
+	outname = openscad_name(inputs)
 	print outname
 	with open(outname,'w') as outfile:
+		scad = openscad_writer(outfile,inputs.thickness,inputs.scad_modules)
 		for i,curr_layer in enumerate(svg_data.layer): 
-			for curr_poly in curr_layer.poly:
-				trans_string = "translate([0,0," + str(i*inputs.thickness) + "])\n"
-				trans_string += "linear_extrude(height=" + str(inputs.thickness) + ")\n"
-				polygon_string = poly_to_openscad(curr_poly.shape)
-				outfile.write(trans_string)
-				outfile.write(polygon_string)
-				outfile.write("\n")
+			scad.add_layer(i,curr_layer)
 				
-			
-def poly_to_openscad(shape):
-	#take a shapely polygon object
-	#and read its exterior coordinates
-	#return a formatted string that will contain#
-	#the OpenSCAD commands to make the equivalent poly
-	polygon_string = "polygon(points=["
-	for point in shape.exterior.coords:
-		polygon_string += '[' + str(point[0]) + ',' + str(point[1]) + '],'
-	#after all the points are added, remove the last comma
-	polygon_string = polygon_string[:-1]
-	polygon_string += ']);\n'
-	return polygon_string
-	
+def write_to_archive(inputs,svg_data):
+	#this function will write the layers to a slice archive
+	#so other tools can read the finished job without slicing it again
+	outname = archive_name(inputs)
+	print outname
+	archive = archive_writer(outname,svg_data.width,svg_data.height,inputs.thickness)
+	for curr_layer in svg_data.layer:
+		archive.add_layer(curr_layer)
+	archive.close()
+
+def archive_name(inputs):
+	return inputs.outputfile[:-4] + ".npz"
+
+def openscad_name(inputs):
+	return inputs.outputfile[:-4] + ".scad"
+
 def get_args(argv,inputs):
 	
 	try:
@@ -699,11 +957,22 @@ def get_args(argv,inputs):
 								   "n1=",
 								   "n2=",
 								   "add-traces",
-								   "verbose"
+								   "verbose",
 								   "mark-areas",
 								   "openscad",
 								   "double",
-								   "error=" ])
+								   "error=",
+								   "jobs=",
+								   "no-cache",
+								   "cache-dir=",
+								   "cache-size=",
+								   "stream-stl",
+								   "stream-layers",
+								   "pipeline",
+								   "archive",
+								   "resume=",
+								   "no-scad-modules",
+								   "order-paths" ])
 	except getopt.GetoptError:
 		usage()      
 		sys.exit(2)
@@ -758,6 +1027,35 @@ def get_args(argv,inputs):
 			inputs.openscad = True
 		elif opt == "--double":
 			inputs.single = False
+		elif opt == "--jobs":
+			inputs.jobs = int(arg)
+			print 'Number of processes is ', str(inputs.jobs)
+		elif opt == "--no-cache":
+			inputs.use_cache = False
+		elif opt == "--cache-dir":
+			inputs.cache_dir = arg
+			print 'Slice cache directory is ', inputs.cache_dir
+		elif opt == "--cache-size":
+			inputs.cache_size = float(arg)
+			print 'Slice cache size limit is ', str(inputs.cache_size), ' MB'
+		elif opt == "--stream-stl":
+			inputs.stream_stl = True
+		elif opt == "--stream-layers":
+			inputs.stream_layers = True
+		elif opt == "--archive":
+			inputs.archive = True
+		elif opt == "--no-scad-modules":
+			inputs.scad_modules = False
+		elif opt == "--order-paths":
+			inputs.order_paths = True
+		elif opt == "--resume":
+			inputs.resume = arg
+			print 'Resuming from ', inputs.resume
+		elif opt == "--pipeline":
+			#the pipeline hands finished layers on as it goes
+			#so it always streams the layers
+			inputs.pipeline = True
+			inputs.stream_layers = True
 		else:
 			print "Argument Error"
 			sys.exit(2)
@@ -766,7 +1064,8 @@ def get_args(argv,inputs):
 		
 def check_inputs(inputs):
 	#first, check to make sure input file is specified
-	if inputs.inputfile == '':
+	#a resumed job reads its layers from an SVG instead
+	if inputs.inputfile == '' and inputs.resume == '':
 		print "No input STL file specified."
 		sys.exit(2)
 	#if there are inputs for single slices and double slices
@@ -832,10 +1131,18 @@ def check_inputs(inputs):
 def load_defaults(inputs):
 	#if no output file is specified
 	#use the input filename as the output file name
-	if inputs.outputfile == '':
+	#when resuming, add to the name of the SVG being read
+	#so it isn't written over while it is read
+	if inputs.outputfile == '' and inputs.resume <> '':
+		end_position = string.rfind(inputs.resume,'.')
+		inputs.outputfile = inputs.resume[:end_position] + '_marked.svg'
+	elif inputs.outputfile == '':
 		end_position = string.find(inputs.inputfile,'.')
 		filename = inputs.inputfile[:end_position]
 		inputs.outputfile = filename + '.svg'
+	if inputs.resume <> '' and os.path.abspath(inputs.outputfile) == os.path.abspath(inputs.resume):
+		print "Output file is the SVG being resumed.  Please choose another output file."
+		sys.exit(2)
 	#if single mode and no thickness added, load default
 	if inputs.thickness == '' and inputs.single:
 		inputs.thickness = inputs.def_thickness
@@ -859,8 +1166,17 @@ def load_defaults(inputs):
 	#If no error specified, use default error
 	if inputs.max_error=='':
 		inputs.max_error=inputs.def_max_error
+	#large binary STL files are streamed from disk during slicing
+	#anything else can't be memory mapped, so load it as usual
+	if inputs.stream_stl and inputs.resume == '' and not is_binary_stl(inputs.inputfile):
+		print "Input STL is not a binary STL file, loading the whole mesh"
+		inputs.stream_stl = False
 	#load the input file mesh into the inputs
-	inputs.current_mesh = mesh.Mesh.from_file(inputs.inputfile)
+	#a resumed job has no mesh
+	if inputs.resume <> '':
+		inputs.stream_stl = False
+	elif not inputs.stream_stl:
+		inputs.current_mesh = mesh.Mesh.from_file(inputs.inputfile)
 	
 		
 def extract_angles(input_string):
@@ -895,14 +1211,31 @@ def usage():
 	print '   --verbose, this option will enable additional output text'
 	print '   --mark-areas, this option will draw the mark areas on the SVG for reference'
 	print '   --openscad, this option will output the geometry into OpenSCAD format for 3D viewing'
+	print '   --no-scad-modules, this option will write out every layer in full in the OpenSCAD output' \
+		  ' instead of sharing a module between identical layers'
 	print '   -e, --error specify maximum error to be used when matching nodes for loops, default 1e-6'
+	print '   --jobs, specify the number of processes used to slice layers and find traces, default 1'
+	print '   --no-cache, this option will always slice the STL instead of using the slice cache'
+	print '   --cache-dir, specify the directory for the slice cache, default ~/.staka_vido_cache'
+	print '   --cache-size, specify the size limit of the slice cache in MB, default 1024'
+	print '   --stream-stl, this option will read a binary STL a block at a time instead of loading it,' \
+		  ' for files larger than memory'
+	print '   --stream-layers, this option will write out each layer as soon as it is finished' \
+		  ' instead of holding every layer in memory'
+	print '   --pipeline, this option will slice, mark and write out layers at the same time,' \
+		  ' it implies --stream-layers'
+	print '   --archive, this option will also write the finished layers to a binary slice archive (.npz)'
+	print '   --order-paths, this option will order the paths of each layer to cut down laser travel,' \
+		  ' engraving first, then holes and cutouts, then the outsides of the parts'
+	print '   --resume, specify an SVG written earlier to read the layers from instead of slicing the STL,' \
+		  ' the traces and markers are found again'
 	
 
-#if __name__ == "__main__":
-#    inputs = input_class()
-#    get_args(sys.argv[1:],inputs)
-#else:
-if True:
+if __name__ == "__main__":
+	inputs = input_class()
+	get_args(sys.argv[1:],inputs)
+else:
+	#when loaded some other way, run the debugging job
 	#right now this is used for debugging
 	#fix this before release
 	inputs = input_class()
@@ -936,7 +1269,14 @@ load_defaults(inputs)
 #prepare the STL by moving it to 
 if inputs.verbose:
 	print "Preparing input STL file"
-stl_prep(inputs)
+if inputs.resume <> '':
+	#the layers are read from the SVG, there is no mesh to prepare
+	pass
+elif inputs.stream_stl:
+	#the streamed mesh is centered when it is rotated
+	pass
+else:
+	stl_prep(inputs)
 
 #after inputs are checked
 #and defaults are loaded
@@ -945,124 +1285,172 @@ stl_prep(inputs)
 #a figure with single cuts
 #or one with double cuts
 #pass the inputs to the correct function
-if inputs.single:
-	if inputs.verbose:
-		print "Single slice mode entered"
-	#take the input file and rotate it according to
-	#input.euler_angle
-	widths = rotate_stl(inputs)
+#the streamed mesh keeps its facets in spill files on disk
+#make sure they are removed however the job ends
+stream = ''
+try:
+	if inputs.single:
+		if inputs.verbose:
+			print "Single slice mode entered"
+		#take the input file and rotate it according to
+		#input.euler_angle
+		if inputs.resume <> '':
+			#read the size of the document from the SVG
+			#the layers are read a layer at a time below
+			resumed_svg = svg_import(inputs.resume,cut_style[1:-1])
+			widths = [resumed_svg.width,resumed_svg.height]
+		elif inputs.stream_stl:
+			#center and rotate the mesh a block at a time
+			#the facets are split into bands of layers on disk when they are sliced
+			stream = stl_stream(inputs)
+			widths = stream.widths
+		else:
+			widths = rotate_stl(inputs)
 
-	#create a document to store the data
-	stack_doc = svg_data()
-	stack_doc.width = widths[0]
-	stack_doc.height = widths[1]
+		#create a document to store the data
+		stack_doc = svg_data()
+		stack_doc.width = widths[0]
+		stack_doc.height = widths[1]
 
 	
-	#Figure out how many layers need to be cut
-	#assume first layer will be half the thickness
-	#then every other layer should be thickness
-	numlayers = int((widths[2]-inputs.thickness/2)/inputs.thickness)+1
-	for i in range(numlayers):
-		cut_z = inputs.thickness/2+i*inputs.thickness
-		print "Cut Plane, Z= ", cut_z
-		if inputs.verbose:
-			print "Reading layer " + str(i+1) + " of " + str(numlayers)
-		layer_points = call_layermaker(inputs,cut_z)
-		print "Size ", len(layer_points)
-			
-		#write data to data structure
-		if inputs.verbose:
-			print "Pushing data to structure...\n"
-		readlayermaker(layer_points,stack_doc)
+		#Figure out how many layers need to be cut
+		#assume first layer will be half the thickness
+		#then every other layer should be thickness
+		if inputs.resume <> '':
+			numlayers = resumed_svg.layer_count
+		else:
+			numlayers = int((widths[2]-inputs.thickness/2)/inputs.thickness)+1
+		cut_heights = [inputs.thickness/2+i*inputs.thickness for i in range(numlayers)]
+		#check the slice cache for an earlier run on the same STL
+		#with the same rotation, thickness and error
+		cached_layers = None
+		if inputs.use_cache and inputs.resume == '':
+			cache_key = slice_key(inputs)
+			cached_layers = load_slices(inputs,cache_key)
+		if inputs.resume <> '':
+			#the polygons of each layer are read back from the SVG as loops
+			#and go through the same steps as freshly sliced loops
+			if inputs.verbose:
+				print "Reading layers from " + inputs.resume
+			layer_source = resumed_svg.layers()
+		elif cached_layers is not None:
+			if inputs.verbose:
+				print "Using cached slices"
+			layer_source = cached_layers
+		elif inputs.stream_stl:
+			#slice one band of the mesh at a time
+			layer_source = stream.layers(inputs,cut_heights)
+		else:
+			#index the mesh connectivity once
+			#so the loops for every layer can be traced face to face
+			if inputs.verbose:
+				print "Indexing mesh"
+			inputs.mesh_index = mesh_index(inputs.current_mesh.vectors)
+			if not inputs.mesh_index.manifold:
+				#an open mesh can't be walked all the way around
+				#fall back to matching segments by their coordinates
+				print "Mesh is not closed, matching segments by coordinates"
+				inputs.mesh_index = ''
+			#slice every layer in one sweep up through the mesh
+			if inputs.jobs > 1:
+				#spread the layers over several processes
+				layer_source = parallel_layermaker(inputs,cut_heights)
+			else:
+				layer_source = sweep_layermaker(inputs,cut_heights)
+		if inputs.pipeline and cached_layers is None:
+			#slice the layers in a child process
+			#running a few layers ahead of the rest of the job
+			layer_source = process_stage(layer_source,queue_layers)
+		if inputs.stream_layers:
+			#build, mark and write out each layer as soon as the layers above it are sliced
+			#so only a few layers are held in memory at a time
+			#new slices aren't stored in the cache, that would mean keeping them all
+			write_layer_window(inputs,layer_source,stack_doc,cut_heights)
+		else:
+			sliced_layers = list()
+			for i,layer_points in enumerate(layer_source):
+				read_layer(inputs,i,cut_heights,layer_points,stack_doc)
+				sliced_layers.append(layer_points)
 		
+			if inputs.use_cache and cached_layers is None and inputs.resume == '':
+				if inputs.verbose:
+					print "Saving slices to cache"
+				store_slices(inputs,cache_key,sliced_layers)
 
 	
-	if inputs.verbose:
-		print "Getting layer traces"
+			if inputs.verbose:
+				print "Getting layer traces"
 	
-	#always get traces
-	for i in range(len(stack_doc.layer)-1):
-		get_traces(stack_doc.layer[i+1],stack_doc.layer[i])
-	#Mark areas are areas on a polygon that is covered by a polygon
-	#that is in turn covered by another polygon
-	#in other words, a place on a polygon that has at least two layers
-	#above it
-	#used in determining where to place any orientation marks
-	get_mark_areas(stack_doc)
-	#search through the polygons to find where to place the markers 
-	#add the markers
-	for i in range(len(stack_doc.layer)-2):
-		#go through every layer except the last two
-		if inputs.verbose:
-			print "\nSearching Layer " + str(i) + "====================="
-		poly_count = 1
-		poly_total = len(stack_doc.layer[i+1].poly)
-		for upper_poly in stack_doc.layer[i+1].poly:
-			#check each polygon in the upper layer
-			#set a boolean bit to see if the marker is found
-			marker_added = False
+			#always get traces
+			#Mark areas are areas on a polygon that is covered by a polygon
+			#that is in turn covered by another polygon
+			#in other words, a place on a polygon that has at least two layers
+			#above it
+			#used in determining where to place any orientation marks
+			if inputs.jobs > 1:
+				get_layer_geometry(stack_doc,inputs.jobs)
+			else:
+				for i in range(len(stack_doc.layer)-1):
+					get_traces(stack_doc.layer[i+1],stack_doc.layer[i])
+				get_mark_areas(stack_doc)
+			#search through the polygons to find where to place the markers 
+			if inputs.jobs > 1:
+				#find where marks fit in every polygon at once
+				#then place them in layer order below
+				if inputs.verbose:
+					print "Searching mark areas"
+				mark_candidates = get_mark_candidates(stack_doc,inputs.jobs)
+			else:
+				mark_candidates = ''
+			#add the markers
+			for i in range(len(stack_doc.layer)-2):
+				#go through every layer except the last two
+				add_layer_markers(stack_doc.layer[i],stack_doc.layer[i+1],i,inputs,mark_candidates)
+				#layer i is done with, the writers only need its points
+				for lower_poly in stack_doc.layer[i].poly:
+					lower_poly.release_shapes()
 			if inputs.verbose:
-				print "Checking Poly " + str(poly_count) + " of " + str(poly_total)
-			#check to see if this polygon intersects with the mark area
-			#of any polygon on the lower layer
-			for lower_poly in stack_doc.layer[i].poly:
-				#a polygon may have one or more mark areas
-				for curr_mark_area in lower_poly.mark_areas:
-					if curr_mark_area.intersects(upper_poly.shape):
-						#if the upper poly intersects the lower poly's
-						#mark area, then try to add a marker
-						#if it returns true, the marker is added
-						#if it returns false, no marker added
-						marker_added = add_marker(lower_poly,upper_poly)
-					
-					if marker_added:
-						#in this case, a marker has been added to this
-						#upper polygon
-						#do not search more mark areas
-						if inputs.verbose:
-							print "Marker added\n"
-						break
-					
-				if marker_added:
-					#in this case, marker has been added to upper poly
-					#do not search more lower polys
-					break
-					
-			poly_count+=1
-	if inputs.verbose:
-		print 'Writing outputs to inkscape'
+				print 'Writing outputs to inkscape'
 									   
-	write_to_inkscape(inputs,stack_doc)
-	if inputs.openscad:
+			write_to_inkscape(inputs,stack_doc)
+			if inputs.openscad:
+				if inputs.verbose:
+					print "Writing OpenSCAD output"
+				write_to_openscad(inputs,stack_doc)
+			if inputs.archive:
+				if inputs.verbose:
+					print "Writing slice archive"
+				write_to_archive(inputs,stack_doc)
+	else:
 		if inputs.verbose:
-			print "Writing OpenSCAD output"
-		write_to_openscad(inputs,stack_doc)
-else:
-	if inputs.verbose:
-		print "Double slice mode entered"
-	#Rotate the STL file into position
-	widths = rotate_stl(inputs)
-	#pass the rotated STL to slic3r
-	call_slic3r(inputs)
-	#the result is an SVG file saved to inputs.outputfile
-	#create a document to store the data from the first slice
-	first_slice = svg_data()
-	#get height and width data
-	first_slice.width = widths[0]
-	first_slice.height = widths[1]
-	#read in the data from the svg file
-	read_svg(inputs.outputfile,first_slice)
-	#then orient the STL file for the second slice
-	widths = orient_stl(inputs)
-	#pass the rotated STL to slic3r again
-	call_slic3r(inputs)
-	#create a document to store the data from the second slice
-	second_slice = svg_data()
-	second_slice.width = widths[0]
-	second_slice.height = widths[1]
-	#read in the data from the SVG file
-	read_svg(inputs.outputfile,second_slice)
-	#at this point, all the data is in the two objects
+			print "Double slice mode entered"
+		#Rotate the STL file into position
+		widths = rotate_stl(inputs)
+		#pass the rotated STL to slic3r
+		call_slic3r(inputs)
+		#the result is an SVG file saved to inputs.outputfile
+		#create a document to store the data from the first slice
+		first_slice = svg_data()
+		#get height and width data
+		first_slice.width = widths[0]
+		first_slice.height = widths[1]
+		#read in the data from the svg file
+		read_svg(inputs.outputfile,first_slice)
+		#then orient the STL file for the second slice
+		widths = orient_stl(inputs)
+		#pass the rotated STL to slic3r again
+		call_slic3r(inputs)
+		#create a document to store the data from the second slice
+		second_slice = svg_data()
+		second_slice.width = widths[0]
+		second_slice.height = widths[1]
+		#read in the data from the SVG file
+		read_svg(inputs.outputfile,second_slice)
+		#at this point, all the data is in the two objects
+	
+finally:
+	if stream <> '':
+		stream.close()
 	
 
 #at this point, the files are sliced into SVG file(s)
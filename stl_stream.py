@@ -0,0 +1,179 @@
+#! /usr/bin/env python
+
+#this script reads binary STL files that are too large to load at once
+#the facets are memory mapped straight from the file
+#and read a block at a time to find the bounds of the mesh,
+#center it, and rotate it the same way stl_prep and rotate_stl do
+#the moved facets are then written into spill files
+#each spill file holds the facets that touch a band of layers
+#so the slicer only ever has one band of the mesh in memory
+
+import os
+import math
+import shutil
+import tempfile
+import numpy as np
+from layermaker import facet_sweep
+from mesh_index import mesh_index
+from rotate_stl import euler_matrix
+
+#layout of one facet in a binary STL file
+facet_dtype = np.dtype([('normals','<f4',(3,)),
+						('vectors','<f4',(3,3)),
+						('attr','<u2')])
+#number of facets to read at a time
+chunk_facets = 1 << 18
+#most spill files to split the layers over
+max_bands = 256
+
+
+def is_binary_stl(filename):
+	#a binary STL file is an 80 byte header, a facet count,
+	#then exactly that many 50 byte facets
+	with open(filename,'rb') as infile:
+		header = infile.read(84)
+	if len(header) < 84:
+		return False
+	count = np.frombuffer(header[80:84],dtype='<u4')[0]
+	return os.path.getsize(filename) == 84 + count*facet_dtype.itemsize
+
+class stl_stream:
+	def __init__(self,inputs):
+		#map the facets of the input file and find the bounds of the moved mesh
+		#the file is read twice here, a block at a time
+		#once for the bounds, and once for the bounds after rotation
+		#the spill files aren't written until the layers are sliced
+		#so the mesh isn't copied to disk if the slices come from the cache
+		#the directory for them is made here, so close can always find it
+		self.verbose = inputs.verbose
+		self.thickness = inputs.thickness
+		self.facets = np.memmap(inputs.inputfile,dtype=facet_dtype,mode='r',offset=84)
+
+		#center the mesh the same way stl_prep does
+		if self.verbose:
+			print "Centering mesh"
+		self.first_move = center_translation(*self.get_bounds(np.zeros(3),np.identity(3),np.zeros(3)))
+
+		#rotate around euler angle
+		#z-x-z extrinsic rotation
+		if self.verbose:
+			print "Rotating Mesh"
+		self.rotation = euler_matrix(inputs.euler_angle)
+		#after rotating, recenter
+		self.second_move = center_translation(*self.get_bounds(self.first_move,self.rotation,np.zeros(3)))
+		self.mesh_min, self.mesh_max = self.get_bounds(self.first_move,self.rotation,self.second_move)
+		self.widths = list(self.mesh_max-self.mesh_min)
+		print self.mesh_min
+
+		#split the layers into bands, one spill file per band
+		numlayers = int((self.widths[2]-self.thickness/2)/self.thickness)+1
+		self.band_layers = max(1,int(math.ceil(float(numlayers)/max_bands)))
+		self.spill_dir = tempfile.mkdtemp(prefix='staka_vido_')
+
+	def moved_chunks(self,first_move,rotation,second_move):
+		#yield the facet verticies a block at a time
+		#moved by first_move, rotated, then moved by second_move
+		for start in range(0,len(self.facets),chunk_facets):
+			vectors = np.array(self.facets['vectors'][start:start+chunk_facets],dtype=np.float64)
+			vectors += first_move
+			vectors = vectors.dot(rotation)
+			vectors += second_move
+			#keep the single precision of the STL file
+			#the same as the mesh would after moving it in memory
+			yield vectors.astype(np.float32)
+
+	def get_bounds(self,first_move,rotation,second_move):
+		#find the minimum and maximum corners of the moved mesh
+		mesh_min = np.full(3,np.inf)
+		mesh_max = np.full(3,-np.inf)
+		for vectors in self.moved_chunks(first_move,rotation,second_move):
+			points = vectors.reshape(-1,3)
+			mesh_min = np.minimum(mesh_min,points.min(axis=0))
+			mesh_max = np.maximum(mesh_max,points.max(axis=0))
+		return mesh_min, mesh_max
+
+	def band_path(self,band):
+		return os.path.join(self.spill_dir,'band' + str(band) + '.f32')
+
+	def write_bands(self):
+		#write every facet to the spill file of each band of layers it touches
+		#layer i is cut at thickness/2 + i*thickness
+		if self.verbose:
+			print "Writing facets to spill files"
+		half = self.thickness/2
+		for vectors in self.moved_chunks(self.first_move,self.rotation,self.second_move):
+			z = vectors[:,:,2].astype(np.float64)
+			first_layer = np.maximum(np.ceil((z.min(axis=1)-half)/self.thickness),0).astype(np.int64)
+			last_layer = np.floor((z.max(axis=1)-half)/self.thickness).astype(np.int64)
+			#facets between two cut planes touch no layer
+			touches = last_layer >= first_layer
+			first_band = first_layer[touches]//self.band_layers
+			band_span = last_layer[touches]//self.band_layers - first_band
+			vectors = vectors[touches]
+			#most facets sit in one band, tall ones are copied
+			#into every band they reach
+			for step in range(band_span.max()+1 if len(vectors) > 0 else 0):
+				reach = band_span >= step
+				bands = first_band[reach]+step
+				reach_vectors = vectors[reach]
+				for band in np.unique(bands):
+					self.append_band(band,reach_vectors[bands==band])
+
+	def append_band(self,band,vectors):
+		with open(self.band_path(band),'ab') as outfile:
+			vectors.tofile(outfile)
+
+	def load_band(self,band):
+		path = self.band_path(band)
+		if not os.path.exists(path):
+			return np.zeros((0,3,3),dtype=np.float32)
+		return np.fromfile(path,dtype=np.float32).reshape(-1,3,3)
+
+	def layers(self,inputs,cut_heights):
+		#yield the loops for each height in cut_heights
+		#the heights must be the layer heights in increasing order
+		#only the band of the current layer is read from disk
+		#the facets are read a third time to write them out into their bands
+		#and the spill files are removed once the layers are done
+		try:
+			self.write_bands()
+			band = -1
+			for i,cut_z in enumerate(cut_heights):
+				if i//self.band_layers != band:
+					band = i//self.band_layers
+					band_heights = cut_heights[band*self.band_layers:(band+1)*self.band_layers]
+					band_vectors = self.load_band(band)
+					sweep = facet_sweep(band_vectors,self.band_index(band_vectors,band_heights))
+					band_loops = sweep.layers(inputs,band_heights)
+				yield band_loops.next()
+		finally:
+			self.close()
+
+	def band_index(self,band_vectors,band_heights):
+		#index the facets of a band, so its loops are walked from face to face
+		#the same as slicing the whole mesh in memory
+		#the band holds every facet that touches its planes
+		#so its loops can be walked as long as the mesh is closed there
+		#otherwise fall back to matching segments by their coordinates
+		if len(band_vectors) == 0:
+			return ''
+		if self.verbose:
+			print "Indexing band"
+		index = mesh_index(band_vectors)
+		if not index.closed_at(band_heights):
+			print "Mesh is not closed, matching segments by coordinates"
+			return ''
+		return index
+
+	def close(self):
+		#remove the spill files
+		if os.path.isdir(self.spill_dir):
+			shutil.rmtree(self.spill_dir)
+
+def center_translation(mesh_min,mesh_max):
+	#move the center of the object to the origin
+	#move the z up to a minimum of zero
+	trans_x = (mesh_min[0]-mesh_max[0])/2-mesh_min[0]
+	trans_y = (mesh_min[1]-mesh_max[1])/2-mesh_min[1]
+	trans_z = -1*mesh_min[2]
+	return np.array([trans_x,trans_y,trans_z])
@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+
+#this script reads back the layers of an SVG file written by staka_vido
+#so the traces, mark areas and markers can be found again
+#after the layers have been edited by hand in inkscape
+#the file is parsed as a stream of elements
+#and each element is thrown away once it is read
+#so only one layer is held in memory at a time
+#the polygons of each layer come back as loops in mm,
+#the same as the slicer gives them
+
+import re
+import numpy as np
+from xml.etree import cElementTree as ElementTree
+
+svg_ns = '{http://www.w3.org/2000/svg}'
+inkscape_ns = '{http://www.inkscape.org/namespaces/inkscape}'
+#90 ppi/25.4 mm per inch = 3.54331 scaling
+inkscape_scale = 3.54331
+
+#pieces of path data, a command letter or a number
+path_token = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+#path data that only moves to and closes polygons, as staka_vido writes them
+simple_path = re.compile(r'^[MZ0-9eE.,+\-\s]*$')
+#the number of values each command takes, the last two are the end point
+command_size = {'M':2,'L':2,'H':1,'V':1,'C':6,'S':4,'Q':4,'T':2,'A':7,'Z':0}
+
+
+class svg_import:
+	def __init__(self,filename,contour_style):
+		#filename is the SVG file to read
+		#contour_style is the style of the polygons to keep
+		#it is used for paths drawn in inkscape, which have no staka_vido id
+		self.filename = filename
+		self.contour_style = contour_style
+		#the size is on the svg element at the very start of the file
+		for event, elem in ElementTree.iterparse(filename,events=('start',)):
+			self.width = svg_length(elem.get('width'))/inkscape_scale
+			self.height = svg_length(elem.get('height'))/inkscape_scale
+			break
+		self.layer_count = count_layers(filename)
+
+	def layers(self):
+		#yield the loops of the polygons on each layer, in order
+		#each loop is an (n,2) array of points in mm
+		context = ElementTree.iterparse(self.filename,events=('start','end'))
+		event, root = context.next()
+		layer_loops = ''
+		for event, elem in context:
+			if elem.tag == svg_ns + 'g' and elem.get(inkscape_ns + 'groupmode') == 'layer':
+				if event == 'start':
+					layer_loops = list()
+				else:
+					yield layer_loops
+					layer_loops = ''
+					#drop everything read so far
+					root.clear()
+			elif event == 'end' and elem.tag == svg_ns + 'path':
+				if layer_loops <> '' and self.is_contour(elem):
+					layer_loops.extend(path_to_loops(elem.get('d')))
+				elem.clear()
+
+	def is_contour(self,elem):
+		#staka_vido names every path it writes by what it is
+		#paths drawn in inkscape are kept if they have the contour style
+		path_id = elem.get('id','')
+		kind = re.match(r'[a-z_]*',path_id).group(0)
+		if kind in ('poly','trace','mark_area','mark','cutout','text'):
+			return kind == 'poly'
+		return elem.get('transform') is None and elem.get('style','').strip() == self.contour_style
+
+def count_layers(filename):
+	#count the layers without parsing the file
+	#by counting the layer groups in blocks of text
+	pattern = 'inkscape:groupmode="layer"'
+	count = 0
+	tail = ''
+	with open(filename,'rb') as infile:
+		block = infile.read(1 << 20)
+		while block:
+			text = tail + block
+			count += text.count(pattern)
+			#keep the end of the block in case the pattern runs into the next one
+			#the kept part is too short to hold the whole pattern
+			tail = text[-(len(pattern)-1):]
+			block = infile.read(1 << 20)
+	return count
+
+def svg_length(length_str):
+	#read a length attribute, dropping any units
+	return float(re.match(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?',length_str.strip()).group(0))
+
+def path_to_loops(path_str):
+	#turn the path data of a polygon into a list of closed loops in mm
+	#undoing the inkscape scale and the flipped y axis
+	if simple_path.match(path_str):
+		#a path written by staka_vido, each subpath is M x,y x,y ... Z
+		#all the numbers of a subpath can be read in one go
+		rings = list()
+		for part in path_str.split('M')[1:]:
+			values = np.array(part.replace('Z',' ').replace(',',' ').split(),dtype=np.float64)
+			rings.append(values[:len(values)//2*2].reshape(-1,2))
+	else:
+		rings = parse_path(path_str)
+	loops = list()
+	for ring in rings:
+		if len(ring) < 3:
+			continue
+		if (ring[0] != ring[-1]).any():
+			#close the loop
+			ring = np.vstack((ring,ring[:1]))
+		loops.append(ring/(inkscape_scale,-inkscape_scale))
+	return loops
+
+def parse_path(path_str):
+	#read any path data into a list of rings of (n,2) points
+	#relative commands are made absolute
+	#curves and arcs are replaced by a straight line to their end point
+	rings = list()
+	ring = list()
+	command = ''
+	x = y = 0.0
+	start_x = start_y = 0.0
+	values = list()
+	for token in path_token.findall(path_str):
+		if token.isalpha():
+			command = token
+			values = list()
+			if command in 'Zz':
+				if len(ring) > 0:
+					rings.append(np.array(ring))
+				ring = list()
+				x, y = start_x, start_y
+			continue
+		if command == '':
+			continue
+		values.append(float(token))
+		size = command_size[command.upper()]
+		if len(values) < size:
+			continue
+		relative = command.islower()
+		upper = command.upper()
+		if upper == 'H':
+			x = values[0] + (x if relative else 0)
+		elif upper == 'V':
+			y = values[0] + (y if relative else 0)
+		else:
+			end_x, end_y = values[-2], values[-1]
+			if relative:
+				end_x += x
+				end_y += y
+			x, y = end_x, end_y
+		if upper == 'M':
+			#a move starts a new ring
+			if len(ring) > 0:
+				rings.append(np.array(ring))
+			ring = list()
+			start_x, start_y = x, y
+			#more points after a move are lines
+			command = 'l' if relative else 'L'
+		ring.append((x,y))
+		values = list()
+	if len(ring) > 0:
+		rings.append(np.array(ring))
+	return rings
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+
+#checks for joining the segments of a slice end to end into loops
+#run with: python -m unittest test_layermaker
+
+import unittest
+import numpy as np
+from shapely.geometry import Polygon
+from layermaker import stitch_segments
+from test_stl_stream import test_inputs
+
+
+def ring_segments(ring,x=0.0,y=0.0):
+	#the segments around a ring of points, moved by x,y
+	ring = np.asarray(ring,dtype=np.float64) + np.array([x,y])
+	return np.stack((ring,np.roll(ring,-1,axis=0)),axis=1)
+
+def shuffle_segments(seg_arr,seed):
+	#put the segments in a random order and flip some of them
+	#the way the slicer finds them, one facet at a time
+	state = np.random.RandomState(seed)
+	seg_arr = seg_arr[state.permutation(len(seg_arr))]
+	flip = state.rand(len(seg_arr)) < 0.5
+	seg_arr[flip] = seg_arr[flip][:,::-1]
+	return seg_arr
+
+square = [(0.0,0.0),(10.0,0.0),(10.0,10.0),(0.0,10.0)]
+
+
+class stitch_segments_test(unittest.TestCase):
+	def check_loops(self,loops,areas):
+		self.assertEqual(len(loops),len(areas))
+		loop_areas = list()
+		for loop in loops:
+			#every loop ends exactly where it started
+			self.assertEqual(loop[0].tolist(),loop[-1].tolist())
+			shape = Polygon(loop)
+			self.assertTrue(shape.is_valid)
+			loop_areas.append(shape.area)
+		for loop_area,area in zip(sorted(loop_areas),sorted(areas)):
+			self.assertAlmostEqual(loop_area,area,6)
+
+	def test_closed_square(self):
+		inputs = test_inputs('')
+		seg_arr = shuffle_segments(ring_segments(square),1)
+		self.check_loops(stitch_segments(seg_arr,inputs),[100.0])
+
+	def test_square_ends_within_error(self):
+		#the ends of the segments only match to within max_error
+		#the loop still closes on its first point
+		inputs = test_inputs('')
+		seg_arr = ring_segments(square)
+		seg_arr[-1,1] += inputs.max_error/2
+		self.check_loops(stitch_segments(seg_arr,inputs),[100.0])
+
+	def test_two_islands(self):
+		#two separate squares cut on the same plane
+		inputs = test_inputs('')
+		seg_arr = np.concatenate((ring_segments(square),ring_segments(square,20.0,5.0)))
+		seg_arr = shuffle_segments(seg_arr,2)
+		self.check_loops(stitch_segments(seg_arr,inputs),[100.0,100.0])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+
+#checks for tracing loops through the mesh index
+#where verticies of the mesh sit exactly on a cut plane
+#run with: python -m unittest test_mesh_index
+
+import math
+import unittest
+import numpy as np
+from shapely.geometry import Polygon
+from mesh_index import mesh_index
+
+
+def cone_vectors(height,radius,sides):
+	#a closed cone with its tip at (0,0,height) and its base at z=0
+	#facing outward, counter-clockwise seen from outside
+	ring = [(radius*math.cos(2*math.pi*k/sides),radius*math.sin(2*math.pi*k/sides),0.0) for k in range(sides)]
+	tip = (0.0,0.0,height)
+	center = (0.0,0.0,0.0)
+	vectors = list()
+	for k in range(sides):
+		vectors.append((ring[k],ring[(k+1)%sides],tip))
+		vectors.append((ring[(k+1)%sides],ring[k],center))
+	return np.array(vectors,dtype=np.float32)
+
+def box_vectors(size,height):
+	#a closed box from z=0 to z=height, each side split into two triangles
+	corners = [(0,0),(size,0),(size,size),(0,size)]
+	vectors = list()
+	for k in range(4):
+		x1,y1 = corners[k]
+		x2,y2 = corners[(k+1)%4]
+		vectors.append(((x1,y1,0),(x2,y2,0),(x2,y2,height)))
+		vectors.append(((x1,y1,0),(x2,y2,height),(x1,y1,height)))
+	top = [(x,y,height) for x,y in corners]
+	bottom = [(x,y,0) for x,y in corners]
+	vectors.append((top[0],top[1],top[2]))
+	vectors.append((top[0],top[2],top[3]))
+	vectors.append((bottom[0],bottom[2],bottom[1]))
+	vectors.append((bottom[0],bottom[3],bottom[2]))
+	return np.array(vectors,dtype=np.float32)
+
+
+class trace_loops_test(unittest.TestCase):
+	def test_cone_tip_on_plane(self):
+		#the tip only touches the plane, so there is no loop there
+		vectors = cone_vectors(4.5,5.0,16)
+		index = mesh_index(vectors)
+		self.assertTrue(index.manifold)
+		faces = np.arange(len(vectors))
+		self.assertEqual(index.trace_loops(4.5,faces),[])
+		#the plane below the tip still cuts one loop
+		loops = index.trace_loops(1.5,faces)
+		self.assertEqual(len(loops),1)
+		self.assertTrue(Polygon(loops[0]).is_valid)
+
+	def test_box_top_on_plane(self):
+		#the top of the box lies on the plane, its outline is still a loop
+		vectors = box_vectors(10.0,4.5)
+		index = mesh_index(vectors)
+		loops = index.trace_loops(4.5,np.arange(len(vectors)))
+		self.assertEqual(len(loops),1)
+		self.assertAlmostEqual(abs(Polygon(loops[0]).area),100.0,5)
+
+	def test_every_loop_has_area(self):
+		#slice the cone on every plane through its verticies
+		vectors = cone_vectors(4.5,5.0,16)
+		index = mesh_index(vectors)
+		faces = np.arange(len(vectors))
+		for cut_z in (0.0,1.5,3.0,4.5):
+			for loop in index.trace_loops(cut_z,faces):
+				self.assertTrue(len(set(map(tuple,loop.tolist()))) >= 3)
+				Polygon(loop)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+
+#checks for ordering the paths of a layer
+#run with: python -m unittest test_path_order
+
+import unittest
+import numpy as np
+from path_order import order_paths, travel_length, engrave_pass, inner_pass, outer_pass
+
+
+def test_paths(count,seed):
+	#paths scattered over a sheet, each in a random pass
+	state = np.random.RandomState(seed)
+	points = state.rand(count,2)*100.0
+	passes = state.choice([engrave_pass,inner_pass,outer_pass],count)
+	return passes, points
+
+def pass_order(passes):
+	#the paths grouped by pass, in the order they were given
+	return np.argsort(passes,kind='mergesort').tolist()
+
+
+class order_paths_test(unittest.TestCase):
+	def test_permutation(self):
+		for seed in range(5):
+			passes, points = test_paths(40,seed)
+			order = order_paths(passes,points)
+			self.assertEqual(sorted(order),range(len(points)))
+
+	def test_pass_order(self):
+		#the passes are kept in order, so parts are cut out last
+		for seed in range(5):
+			passes, points = test_paths(40,seed)
+			order = order_paths(passes,points)
+			self.assertEqual(passes[order].tolist(),sorted(passes.tolist()))
+
+	def test_travel(self):
+		#the travel is never longer than taking the paths as given within each pass
+		for seed in range(5):
+			passes, points = test_paths(40,seed)
+			order = order_paths(passes,points)
+			self.assertTrue(travel_length(points,order) <= travel_length(points,pass_order(passes)))
+
+	def test_single_pass_line(self):
+		#points along a line, given out of order, are taken end to end
+		points = np.array([(3.0,0.0),(1.0,0.0),(4.0,0.0),(2.0,0.0),(5.0,0.0)])
+		passes = [inner_pass]*len(points)
+		order = order_paths(passes,points)
+		self.assertEqual(order,[1,3,0,2,4])
+		self.assertAlmostEqual(travel_length(points,order),5.0)
+
+	def test_empty(self):
+		self.assertEqual(order_paths([],np.zeros((0,2))),[])
+
+if __name__ == '__main__':
+	unittest.main()
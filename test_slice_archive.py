@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+
+#checks for writing a slice archive and reading it back memory mapped
+#run with: python -m unittest test_slice_archive
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from shapely.geometry import Polygon, Point
+from slice_archive import archive_writer, slice_archive, pack_layer, archive_kinds
+
+
+def square(x,y,size):
+	return np.array([(x,y),(x+size,y),(x+size,y+size),(x,y+size),(x,y)],dtype=np.float64)
+
+class test_poly:
+	#the parts of a polygon that pack_layer reads
+	def __init__(self,x,y,marked):
+		self.points = square(x,y,10.0)
+		self.holes = [square(x+4.0,y+4.0,2.0)]
+		self.traces = [Polygon(square(x+1.0,y+1.0,3.0))]
+		self.mark_areas = [Polygon(square(x+1.0,y+6.0,3.0)),Polygon(square(x+6.0,y+1.0,3.0))]
+		if marked:
+			self.mark = [square(x+2.0,y+7.0,1.0)]
+			self.mark_point = Point(x+2.5,y+7.5)
+		else:
+			self.mark = list()
+			self.mark_point = 'dummy'
+		self.cutout = list()
+
+class test_layer:
+	def __init__(self,polys):
+		self.poly = polys
+
+def test_layers():
+	#two polygons on the first layer, none on the second, one on the third
+	return [test_layer([test_poly(0.0,0.0,False),test_poly(20.0,0.0,True)]),
+			test_layer([]),
+			test_layer([test_poly(5.0,5.0,True)])]
+
+
+class slice_archive_test(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.temp_dir,'job.npz')
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def write_archive(self,layers):
+		writer = archive_writer(self.filename,100.0,50.0,3.0)
+		for curr_layer in layers:
+			writer.add_layer(curr_layer)
+		writer.close()
+		#the spill files are gone once the archive is written
+		self.assertFalse(os.path.exists(writer.spill_dir))
+
+	def check_layer(self,packed,read):
+		self.assertEqual(len(packed),len(read))
+		for poly_shapes,read_shapes in zip(packed,read):
+			for kind in archive_kinds:
+				self.assertEqual(len(poly_shapes[kind]),len(read_shapes[kind]))
+				for rings,read_rings in zip(poly_shapes[kind],read_shapes[kind]):
+					self.assertEqual(len(rings),len(read_rings))
+					for ring,read_ring in zip(rings,read_rings):
+						self.assertTrue(np.array_equal(ring,read_ring))
+			if np.isnan(poly_shapes['mark_point']).any():
+				self.assertEqual(read_shapes['mark_point'],'dummy')
+			else:
+				self.assertEqual(read_shapes['mark_point'],tuple(poly_shapes['mark_point']))
+
+	def test_write_and_read(self):
+		layers = test_layers()
+		self.write_archive(layers)
+		archive = slice_archive(self.filename)
+		self.assertEqual((archive.width,archive.height,archive.thickness),(100.0,50.0,3.0))
+		self.assertEqual(archive.layer_count,len(layers))
+		#the arrays are read from the file as they are used
+		self.assertTrue(isinstance(archive.arrays['poly_coords'],np.memmap))
+		#read the layers out of order
+		for i in (2,0,1):
+			self.check_layer(pack_layer(layers[i]),archive.layer(i))
+
+	def test_read_as_npz(self):
+		#numpy reads the archive as an ordinary .npz file
+		layers = test_layers()
+		self.write_archive(layers)
+		archive = slice_archive(self.filename)
+		with np.load(self.filename) as data:
+			for name in archive.arrays.keys():
+				#the polygons with no mark have nan mark points
+				self.assertTrue(np.array_equal(np.nan_to_num(data[name]),np.nan_to_num(archive.arrays[name])))
+
+	def test_discard(self):
+		writer = archive_writer(self.filename,100.0,50.0,3.0)
+		writer.add_layer(test_layers()[0])
+		writer.discard()
+		self.assertFalse(os.path.exists(writer.spill_dir))
+		self.assertFalse(os.path.exists(self.filename))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+
+#checks for storing sliced layers in the cache and trimming it
+#run with: python -m unittest test_slice_cache
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from slice_cache import slice_key, load_slices, store_slices, trim_cache, cache_path
+
+
+class cache_inputs:
+	#the inputs the cache reads
+	def __init__(self,inputfile,cache_dir):
+		self.inputfile = inputfile
+		self.euler_angle = (0,0,0)
+		self.thickness = 3.0
+		self.max_error = 1e-6
+		self.stream_stl = False
+		self.cache_dir = cache_dir
+		self.cache_size = 512
+
+def test_layers(count):
+	#layers of squares, with an empty layer in the middle
+	layers = list()
+	for i in range(count):
+		size = 10.0+i
+		square = np.array([(0,0),(size,0),(size,size),(0,size),(0,0)],dtype=np.float64)
+		layers.append([square,square/2+1.0])
+	layers.insert(count//2,[])
+	return layers
+
+
+class slice_cache_test(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		self.inputfile = os.path.join(self.temp_dir,'part.stl')
+		with open(self.inputfile,'wb') as outfile:
+			outfile.write('solid part\nendsolid part\n')
+		self.inputs = cache_inputs(self.inputfile,os.path.join(self.temp_dir,'cache'))
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def test_round_trip(self):
+		layers = test_layers(4)
+		key = slice_key(self.inputs)
+		self.assertEqual(load_slices(self.inputs,key),None)
+		store_slices(self.inputs,key,layers)
+		loaded = load_slices(self.inputs,key)
+		self.assertEqual(len(loaded),len(layers))
+		for layer_loops,loaded_loops in zip(layers,loaded):
+			self.assertEqual(len(layer_loops),len(loaded_loops))
+			for loop,loaded_loop in zip(layer_loops,loaded_loops):
+				self.assertTrue(np.array_equal(loop,loaded_loop))
+
+	def test_key_changes(self):
+		#anything that changes the slices gives a different entry
+		key = slice_key(self.inputs)
+		self.assertEqual(slice_key(self.inputs),key)
+		self.inputs.thickness = 1.5
+		thin_key = slice_key(self.inputs)
+		self.assertNotEqual(thin_key,key)
+		self.inputs.stream_stl = True
+		self.assertNotEqual(slice_key(self.inputs),thin_key)
+
+	def test_trim_oldest(self):
+		#store three entries, used one after the other
+		keys = ['entry' + str(k) for k in range(3)]
+		for used,key in enumerate(keys):
+			store_slices(self.inputs,key,test_layers(3))
+			os.utime(cache_path(self.inputs,key),(1000+used,1000+used))
+		#loading the oldest entry marks it as used
+		self.assertNotEqual(load_slices(self.inputs,keys[0]),None)
+		sizes = [os.path.getsize(cache_path(self.inputs,key)) for key in keys]
+		trim_cache(self.inputs.cache_dir,sizes[0]+sizes[2])
+		kept = [os.path.exists(cache_path(self.inputs,key)) for key in keys]
+		self.assertEqual(kept,[True,False,True])
+
+if __name__ == '__main__':
+	unittest.main()
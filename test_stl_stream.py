@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+
+#checks for slicing meshes of several separate parts
+#through the streaming slicer and the coordinate matching slicer
+#run with: python -m unittest test_stl_stream
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import stl
+from stl import mesh
+from shapely.geometry import Polygon
+from layermaker import facet_sweep
+from stl_stream import stl_stream
+from test_mesh_index import box_vectors
+
+
+class test_inputs:
+	#the inputs the slicers read
+	def __init__(self,inputfile):
+		self.inputfile = inputfile
+		self.thickness = 3.0
+		self.euler_angle = (0,0,0)
+		self.max_error = 1e-6
+		self.verbose = False
+		self.mesh_index = ''
+
+def moved_box(size,height,x,y,z):
+	vectors = box_vectors(size,height)
+	vectors += np.array([x,y,z],dtype=np.float32)
+	return vectors
+
+def islands_vectors():
+	#a three by three grid of separate boxes
+	boxes = [moved_box(4.0,9.0,8.0*i,8.0*j,0.0) for i in range(3) for j in range(3)]
+	return np.concatenate(boxes)
+
+def steps_vectors():
+	#a stack of boxes, each smaller than the one below it
+	boxes = [moved_box(12.0-3.0*k,3.0,1.5*k,1.5*k,3.0*k) for k in range(3)]
+	return np.concatenate(boxes)
+
+def save_stl(vectors,filename):
+	stl_mesh = mesh.Mesh(np.zeros(len(vectors),dtype=mesh.Mesh.dtype))
+	stl_mesh.vectors[:] = vectors
+	stl_mesh.save(filename,mode=stl.Mode.BINARY)
+
+def cut_heights(thickness,height):
+	numlayers = int((height-thickness/2)/thickness)+1
+	return [thickness/2+i*thickness for i in range(numlayers)]
+
+
+class stream_slice_test(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def check_layers(self,layers,loop_counts):
+		self.assertEqual([len(layer_loops) for layer_loops in layers],loop_counts)
+		for layer_loops in layers:
+			for loop in layer_loops:
+				self.assertTrue(Polygon(loop).is_valid)
+
+	def stream_layers(self,vectors):
+		filename = os.path.join(self.temp_dir,'parts.stl')
+		save_stl(vectors,filename)
+		inputs = test_inputs(filename)
+		stream = stl_stream(inputs)
+		try:
+			return list(stream.layers(inputs,cut_heights(inputs.thickness,stream.widths[2])))
+		finally:
+			stream.close()
+
+	def test_stream_islands(self):
+		self.check_layers(self.stream_layers(islands_vectors()),[9,9,9])
+
+	def test_stream_steps(self):
+		self.check_layers(self.stream_layers(steps_vectors()),[1,1,1])
+
+	def test_stitch_islands(self):
+		#match the segments by their coordinates, without the mesh index
+		vectors = islands_vectors()
+		inputs = test_inputs('')
+		self.check_layers(list(facet_sweep(vectors).layers(inputs,[1.5,4.5,7.5])),[9,9,9])
+
+	def test_stitch_steps(self):
+		vectors = steps_vectors()
+		inputs = test_inputs('')
+		self.check_layers(list(facet_sweep(vectors).layers(inputs,[1.5,4.5,7.5])),[1,1,1])
+
+if __name__ == '__main__':
+	unittest.main()
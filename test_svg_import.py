@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+
+#checks for reading the layers back from an SVG file to resume a job
+#run with: python -m unittest test_svg_import
+#the file is laid out the way staka_vido writes it,
+#with one path drawn in inkscape added to the second layer
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from svg_import import svg_import, path_to_loops, parse_path
+
+contour_style = 'fill:none;stroke:#000000;stroke-width:0.1'
+
+test_svg = '''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg
+   xmlns="http://www.w3.org/2000/svg"
+   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+   width="354.331mm"
+   height="177.1655"
+   id="part.svg"
+   version="1.1">
+  <g
+     inkscape:groupmode="layer"
+     id="layer0"
+     inkscape:label="Layer 0">
+    <g
+       id="poly_group0">
+      <path
+         id="poly0_0"
+         d="M 0.0,0.0 35.4331,0.0 35.4331,-35.4331 0.0,-35.4331 Z M 7.08662,-7.08662 14.17324,-7.08662 14.17324,-14.17324 Z"
+         style="''' + contour_style + '''" />
+    </g>
+    <path
+       id="trace0_0"
+       d="M 1.0,-1.0 2.0,-1.0 2.0,-2.0 Z"
+       style="fill:none;stroke:#ff0000;stroke-width:0.1" />
+    <path
+       id="mark_area0_0"
+       d="M 3.0,-3.0 4.0,-3.0 4.0,-4.0 Z"
+       style="fill:none;stroke:#0000ff;stroke-width:0.1" />
+  </g>
+  <g
+     inkscape:groupmode="layer"
+     id="layer1"
+     inkscape:label="Layer 1">
+    <g
+       id="poly_group1">
+      <path
+         id="poly1_0"
+         d="M 0.0,0.0 35.4331,0.0 35.4331,-35.4331 0.0,-35.4331 Z"
+         style="''' + contour_style + '''" />
+    </g>
+    <path
+       id="path4021"
+       d="m 70.8662,0 h 35.4331 v -35.4331 h -35.4331 z"
+       style="''' + contour_style + '''" />
+    <path
+       id="path4023"
+       d="m 70.8662,0 h 3.54331 v -3.54331 z"
+       style="fill:none;stroke:#ff0000;stroke-width:0.1" />
+  </g>
+  <g
+     inkscape:groupmode="layer"
+     id="layer2"
+     inkscape:label="Layer 2">
+  </g>
+</svg>
+'''
+
+def square(x,y,size):
+	return np.array([(x,y),(x+size,y),(x+size,y+size),(x,y+size),(x,y)],dtype=np.float64)
+
+
+class svg_import_test(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.temp_dir,'part.svg')
+		with open(self.filename,'w') as outfile:
+			outfile.write(test_svg)
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def test_size(self):
+		layers = svg_import(self.filename,contour_style)
+		self.assertAlmostEqual(layers.width,100.0,6)
+		self.assertAlmostEqual(layers.height,50.0,6)
+		self.assertEqual(layers.layer_count,3)
+
+	def test_layers(self):
+		layers = list(svg_import(self.filename,contour_style).layers())
+		self.assertEqual([len(layer_loops) for layer_loops in layers],[2,2,0])
+		#the outside and the hole of the first polygon, in mm
+		self.assertTrue(np.allclose(layers[0][0],square(0.0,0.0,10.0)))
+		self.assertTrue(np.allclose(layers[0][1],[(2.0,2.0),(4.0,2.0),(4.0,4.0),(2.0,2.0)]))
+		#the path drawn in inkscape has the contour style, so it is kept
+		#the one in another style is left out
+		self.assertTrue(np.allclose(layers[1][1],square(20.0,0.0,10.0)))
+
+	def test_path_to_loops(self):
+		#the same square written as staka_vido does and with relative commands
+		simple = path_to_loops("M 0.0,0.0 35.4331,0.0 35.4331,-35.4331 0.0,-35.4331 Z")
+		relative = path_to_loops("m 0,0 35.4331,0 0,-35.4331 h -35.4331 z")
+		self.assertEqual(len(simple),1)
+		self.assertEqual(len(relative),1)
+		self.assertTrue(np.allclose(simple[0],relative[0]))
+		self.assertTrue(np.allclose(simple[0],square(0.0,0.0,10.0)))
+
+	def test_parse_path_curves(self):
+		#a curve is replaced by a straight line to its end point
+		rings = parse_path("M 0,0 C 1,1 2,1 3,0 L 3,3 Z M 10,10 l 1,0 0,1 z")
+		self.assertEqual(len(rings),2)
+		self.assertTrue(np.allclose(rings[0],[(0,0),(3,0),(3,3)]))
+		self.assertTrue(np.allclose(rings[1],[(10,10),(11,10),(11,11)]))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,47 @@
+#! /usr/bin/env python
+
+#this script runs work over a pool of forked worker processes
+#the large inputs of a job, like the mesh or the shapes of every layer,
+#are put in worker_state before the workers are forked
+#so each worker finds them there without them being pickled
+#only the task arguments and the results pass between the processes
+#the state is dropped again once the pool is closed
+#so it doesn't stay in memory for the rest of the job
+
+import multiprocessing
+
+#the state the worker functions read, by name
+worker_state = dict()
+
+
+class forked_pool:
+	#this class is a pool of jobs worker processes
+	#forked with the keyword arguments set in worker_state
+	#it has to be closed once the work is done, even if it fails
+	def __init__(self,jobs,**state):
+		self.names = state.keys()
+		worker_state.update(state)
+		try:
+			self.pool = multiprocessing.Pool(jobs)
+		except Exception:
+			self.clear_state()
+			raise
+
+	def imap(self,func,tasks,chunk=1):
+		#run func on every task, and yield the results in order
+		return self.pool.imap(func,tasks,chunk)
+
+	def close(self):
+		#wait for the workers to finish, then drop the state
+		self.pool.close()
+		self.pool.join()
+		self.clear_state()
+
+	def clear_state(self):
+		for name in self.names:
+			worker_state.pop(name,None)
+
+def chunk_size(task_count,jobs):
+	#hand each worker a few chunks of tasks
+	#so a worker that gets quick tasks doesn't sit idle
+	return max(1,task_count//(4*jobs))